@@ -34,37 +34,12 @@ class Bot(Client):
         self.username = me.username
         self.mention = me.mention
         self.uptime = datetime.now()             
-        self.channel_info = {}
-        
-        # Load force subscription channel info
-        for channel_id in Config.FORCE_SUB_CHANNEL:
-            try:
-                chat = await self.get_chat(channel_id)
-                title = chat.title
-                link = chat.invite_link
-        
-                if not link:
-                    link = await self.export_chat_invite_link(channel_id)
-                    
-                self.channel_info[channel_id] = {"title": title, "invite_link": link}
-                print(f"✅ Loaded force channel info: {title} - {link}")
-            except Exception as e:
-                print(f"❌ Error loading force channel {channel_id}: {e}")
 
-        # Load request channel info
-        request_channels = getattr(Config, 'REQUEST_CHANNEL', [])
-        for channel_id in request_channels:
-            try:
-                chat = await self.get_chat(channel_id)
-                title = chat.title
-                
-                self.channel_info[channel_id] = {"title": title, "invite_link": None}
-                print(f"✅ Loaded request channel info: {title}")
-            except Exception as e:
-                print(f"❌ Error loading request channel {channel_id}: {e}")
+        # Load force subscription and request channel info
+        from bot.utils.channels import channel_store
+        await channel_store.warm(self)
+        self.channel_info = channel_store.channels
 
-        
-        
         # Initialize database channel
         try:
             db_channel = await self.get_chat(Config.CHANNEL_ID)
@@ -82,8 +57,34 @@ class Bot(Client):
         self.log(__name__).info(f"Bot Running..!\n\nCreated by \nhttps://t.me/ps_updates")
         print("""Welcome to Mother Bot - File Sharing System""")
 
-        await schedule_manager.start()
-        asyncio.create_task(schedule_manager.recover_pending_tasks())
+        # Create any missing MongoDB indexes before serving traffic
+        from bot.database.indexes import ensure_indexes, IndexConflictError
+        try:
+            await ensure_indexes()
+        except IndexConflictError as e:
+            self.log(__name__).error(f"MongoDB index conflict: {e}")
+            self.log(__name__).info("\nBot Stopped. Drop or rename the conflicting index and restart")
+            sys.exit()
+        except Exception as e:
+            self.log(__name__).warning(f"Could not verify MongoDB indexes: {e}")
+
+        # Backfill search tokens for files indexed before search_tokens existed
+        from bot.database.index_db import backfill_search_tokens
+        asyncio.create_task(backfill_search_tokens())
+
+        # Keep channel titles and invite links fresh
+        asyncio.create_task(channel_store.refresh_forever(self))
+
+        # Pick up broadcasts interrupted by the last shutdown
+        from bot.utils.broadcast import broadcast_engine
+        asyncio.create_task(broadcast_engine.resume(self))
+
+        # Resume channel crawls from their last checkpoint
+        from bot.utils.indexer import index_jobs
+        asyncio.create_task(index_jobs.resume(self))
+
+        # Pending auto-delete tasks are picked up by the scheduler's poller
+        await schedule_manager.start(self)
         
         if Config.WEB_MODE:
             from web import start_webserver
@@ -1,7 +1,9 @@
 from .users import (
     add_user,
     del_user,
+    del_users,
     full_userbase,
+    get_user_ids_after,
     present_user,
     get_users_count
 )
@@ -19,23 +21,29 @@ from .premium_db import (
 )
 from .auto_delete_db import (
     save_delete_task,
-    delete_saved_task,
-    get_all_delete_tasks
+    delete_saved_task
 )
 from .index_db import (
     add_to_index,
+    build_index_document,
+    bulk_index,
     search_files,
+    search_files_by_name,
     get_popular_files,
     get_recent_files,
     get_random_files,
     increment_access_count,
+    increment_access_counts,
     remove_from_index,
+    remove_files_from_index,
+    sample_channel_file_ids,
     get_index_stats,
     update_file_keywords
 )
 from .command_usage_db import (
     get_user_command_count,
     increment_command_count,
+    consume_free_command,
     reset_command_count,
     get_command_stats
 )
\ No newline at end of file
@@ -1,6 +1,9 @@
+import secrets
+import tzlocal
+from pymongo import UpdateOne
 from .connection import db
 from typing import List, Union
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 collection = db["schedule_delete"]
 
@@ -9,18 +12,69 @@ async def save_delete_task(
     message_ids: List[int],
     base64_file_link: str,
     run_time: Union[str, datetime],
-    task_id: str
+    task_id: str,
+    lease: str = None,
+    leased_until: datetime = None
 ):
     await collection.insert_one({
         "_id": task_id,
         "chat_id": chat_id,
         "message_ids": message_ids,
         "base64_file_link": base64_file_link,
-        "run_time": run_time if isinstance(run_time, str) else run_time.isoformat(),
+        # Stored as a date so the TTL index on run_time applies
+        "run_time": datetime.fromisoformat(run_time) if isinstance(run_time, str) else run_time,
+        # A process that keeps the task in memory holds it leased; pollers only
+        # take it over if that process is gone once the lease runs out
+        "lease": lease,
+        "leased_until": leased_until,
     })
 
 async def delete_saved_task(task_id: str):
     await collection.delete_one({"_id": task_id})
 
-async def get_all_delete_tasks() -> List[dict]:
-    return await collection.find({}).to_list(length=None)
+async def delete_saved_tasks(task_ids: List[str]):
+    """Remove many finished tasks in one round-trip"""
+    if task_ids:
+        await collection.delete_many({"_id": {"$in": list(task_ids)}})
+
+async def claim_due_tasks(limit: int = 500, lease_seconds: int = 120) -> List[dict]:
+    """
+    Lease up to limit tasks whose run_time has passed, oldest first. Each task
+    goes to exactly one caller, even with several bot processes polling; a
+    lease that is not released (crash mid-delete) expires and the task is retried.
+    """
+    now = datetime.now(timezone.utc)
+    available = {"run_time": {"$lte": now}, "$or": [{"leased_until": None}, {"leased_until": {"$lt": now}}]}
+
+    due = await collection.find(available, {"_id": 1}).sort("run_time", 1).limit(limit).to_list(length=limit)
+    if not due:
+        return []
+
+    lease = secrets.token_hex(8)
+    await collection.update_many(
+        {"_id": {"$in": [task["_id"] for task in due]}, **available},
+        {"$set": {"lease": lease, "leased_until": now + timedelta(seconds=lease_seconds)}}
+    )
+    return await collection.find({"lease": lease}).to_list(length=limit)
+
+async def migrate_string_run_times() -> int:
+    """
+    Convert run_time of tasks saved by older versions (ISO strings) to dates,
+    so the due-task poll and the TTL index pick them up. Naive strings were
+    written in local time. Returns how many tasks were converted.
+    """
+    now = datetime.now(timezone.utc)
+    ops = []
+    async for task in collection.find({"run_time": {"$type": "string"}}, {"run_time": 1}):
+        try:
+            run_time = datetime.fromisoformat(task["run_time"])
+            if run_time.tzinfo is None:
+                run_time = run_time.replace(tzinfo=tzlocal.get_localzone())
+        except (TypeError, ValueError):
+            # Unreadable: run it at the next poll rather than keeping it forever
+            run_time = now
+        ops.append(UpdateOne({"_id": task["_id"]}, {"$set": {"run_time": run_time}}))
+
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+    return len(ops)
@@ -0,0 +1,44 @@
+from datetime import datetime
+from bson import ObjectId
+from .connection import db
+
+broadcasts_col = db["broadcasts"]
+
+BROADCAST_COUNTERS = ("sent", "blocked", "deleted", "failed", "pruned", "total")
+
+
+async def create_broadcast(source: dict, admin_chat_id: int, status_message_id: int) -> dict:
+    """Persist a new broadcast job; source is {"type": "copy", "chat_id", "message_id"} or {"type": "text", "text"}"""
+    job = {
+        "_id": ObjectId(),
+        "source": source,
+        "admin_chat_id": admin_chat_id,
+        "status_message_id": status_message_id,
+        "state": "running",
+        "last_user_id": None,
+        "counts": {counter: 0 for counter in BROADCAST_COUNTERS},
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+    await broadcasts_col.insert_one(job)
+    return job
+
+
+async def save_broadcast_progress(job_id, last_user_id, counts: dict):
+    """Checkpoint a job: every user up to and including last_user_id has been handled"""
+    await broadcasts_col.update_one(
+        {"_id": job_id},
+        {"$set": {"last_user_id": last_user_id, "counts": counts, "updated_at": datetime.utcnow()}}
+    )
+
+
+async def finish_broadcast(job_id, counts: dict, state: str = "done"):
+    await broadcasts_col.update_one(
+        {"_id": job_id},
+        {"$set": {"state": state, "counts": counts, "updated_at": datetime.utcnow(), "finished_at": datetime.utcnow()}}
+    )
+
+
+async def get_running_broadcasts() -> list:
+    """Jobs that were still running when the bot stopped"""
+    return await broadcasts_col.find({"state": "running"}).to_list(length=None)
@@ -1,6 +1,8 @@
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError
 from .connection import db
 from info import Config
+from .entitlements import invalidate_entitlement, FREE_COMMAND_LIMIT
 
 command_usage_col = db["command_usage"]
 
@@ -23,6 +25,32 @@ async def increment_command_count(user_id: int):
         },
         upsert=True
     )
+    invalidate_entitlement(user_id)
+
+async def consume_free_command(user_id: int, limit: int = FREE_COMMAND_LIMIT) -> bool:
+    """Atomically use one free command if the user is below limit; False once the limit is reached"""
+    # The limit lives in the filter, so check-and-increment is one round-trip
+    # and stays correct with several bot processes sharing the database
+    query = {
+        "_id": user_id,
+        "$or": [{"command_count": {"$lt": limit}}, {"command_count": {"$exists": False}}]
+    }
+    update = {
+        "$inc": {"command_count": 1},
+        "$set": {"last_command_at": datetime.utcnow()}
+    }
+    try:
+        result = await command_usage_col.find_one_and_update(query, update, upsert=True)
+    except DuplicateKeyError:
+        # Either the user is at the limit, or a concurrent first command inserted
+        # the document first; retry without upsert so only the limit counts as False
+        result = await command_usage_col.find_one_and_update(query, update)
+        if result is None:
+            return False
+
+    invalidate_entitlement(user_id)
+    print(f"DEBUG: User {user_id} used free command {(result or {}).get('command_count', 0) + 1}/{limit}")
+    return True
 
 async def reset_command_count(user_id: int):
     """Reset command count for a user"""
@@ -32,6 +60,7 @@ async def reset_command_count(user_id: int):
             {"$set": {"command_count": 0}},
             upsert=True
         )
+        invalidate_entitlement(user_id)
         return True
     except Exception as e:
         print(f"Error resetting command count for {user_id}: {e}")
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime
+from .connection import db
+from info import Config
+
+users_col = db['users']
+premium_col = db['premium_users']
+verified_col = db['verified_users']
+command_usage_col = db['command_usage']
+
+FREE_COMMAND_LIMIT = 3     # Free commands between verifications
+ENTITLEMENT_TTL = 30       # Seconds a loaded entitlement is trusted
+ENTITLEMENT_CACHE_SIZE = 10000
+
+
+class Entitlement:
+    """A user's premium, verification and command-usage state, loaded in one read"""
+
+    def __init__(self, user_id: int, premium: dict = None, verified: dict = None, usage: dict = None):
+        self.user_id = user_id
+        self.premium = premium
+        self.verified = verified
+        self.usage = usage
+
+    @property
+    def is_admin(self) -> bool:
+        return self.user_id in Config.ADMINS or self.user_id == Config.OWNER_ID
+
+    @property
+    def tokens_remaining(self) -> int:
+        return (self.premium or {}).get('tokens_remaining', 0)
+
+    @property
+    def premium_expired(self) -> bool:
+        """Premium document is still flagged active but no longer grants access"""
+        if not self.premium or not self.premium.get('is_active', True):
+            return False
+        if self.tokens_remaining == -1:
+            expiry_date = self.premium.get('expiry_date')
+            return bool(expiry_date and expiry_date < datetime.utcnow())
+        return self.tokens_remaining <= 0
+
+    @property
+    def is_premium(self) -> bool:
+        """Same rules as premium_db.is_premium_user"""
+        if not self.premium or not self.premium.get('is_active', True):
+            return False
+        return not self.premium_expired
+
+    @property
+    def is_verified(self) -> bool:
+        return bool(self.verified and self.verified.get('is_verified'))
+
+    @property
+    def command_count(self) -> int:
+        return (self.usage or {}).get('command_count', 0)
+
+    def command_status(self) -> tuple[bool, int]:
+        """(needs_verification, remaining_commands), -1 meaning unlimited"""
+        if self.is_admin:
+            return False, -1
+
+        if self.is_premium:
+            if self.tokens_remaining == -1:
+                return False, -1
+            return False, self.tokens_remaining
+
+        if self.command_count >= FREE_COMMAND_LIMIT:
+            return True, 0
+        return False, FREE_COMMAND_LIMIT - self.command_count
+
+
+# Loaded entitlements: {user_id: (Entitlement, expires_at)}
+_cache = OrderedDict()
+
+
+def invalidate_entitlement(user_id: int):
+    """Forget a cached entitlement; called by every write to the underlying collections"""
+    _cache.pop(user_id, None)
+
+
+def _remember(entitlement: Entitlement):
+    _cache[entitlement.user_id] = (entitlement, time.monotonic() + ENTITLEMENT_TTL)
+    _cache.move_to_end(entitlement.user_id)
+    while len(_cache) > ENTITLEMENT_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+async def _load_entitlement(user_id: int) -> Entitlement:
+    """Join the three per-user documents onto the users document in one aggregation"""
+    pipeline = [
+        {'$match': {'_id': user_id}},
+        {'$lookup': {'from': premium_col.name, 'localField': '_id', 'foreignField': '_id', 'as': 'premium'}},
+        {'$lookup': {'from': verified_col.name, 'localField': '_id', 'foreignField': '_id', 'as': 'verified'}},
+        {'$lookup': {'from': command_usage_col.name, 'localField': '_id', 'foreignField': '_id', 'as': 'usage'}},
+    ]
+    docs = await users_col.aggregate(pipeline).to_list(length=1)
+
+    if docs:
+        doc = docs[0]
+        premium, verified, usage = (doc[key][0] if doc[key] else None for key in ('premium', 'verified', 'usage'))
+    else:
+        # Users who never ran /start have no users document to join onto
+        premium, verified, usage = await asyncio.gather(
+            premium_col.find_one({'_id': user_id}),
+            verified_col.find_one({'_id': user_id}),
+            command_usage_col.find_one({'_id': user_id}),
+        )
+
+    entitlement = Entitlement(user_id, premium, verified, usage)
+
+    # Keep is_active honest, as is_premium_user does
+    if entitlement.premium_expired:
+        await premium_col.update_one({'_id': user_id}, {'$set': {'is_active': False}})
+        entitlement.premium['is_active'] = False
+
+    return entitlement
+
+
+async def get_entitlement(user_id: int, fresh: bool = False) -> Entitlement:
+    """Return the user's entitlement, from cache when it is younger than ENTITLEMENT_TTL"""
+    if not fresh:
+        cached = _cache.get(user_id)
+        if cached and cached[1] > time.monotonic():
+            _cache.move_to_end(user_id)
+            return cached[0]
+
+    entitlement = await _load_entitlement(user_id)
+    _remember(entitlement)
+    return entitlement
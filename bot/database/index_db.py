@@ -2,14 +2,26 @@ from .connection import db
 from datetime import datetime
 from typing import List, Dict, Optional
 import re
+import json
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from info import Config
+from ..utils.encoder import encode, decode
 from ..utils.helper import get_collection_name
+from ..utils.message_cache import message_cache
 from ..utils.security import SecurityValidator
 
 collection = db["file_index"]
 
-async def add_to_index(file_id: str, file_name: str, file_type: str, file_size: int, caption: str = "", user_id: int = None):
-    """Add a file to the search index"""
+# Search index tuning
+MIN_PREFIX_LENGTH = 3      # Shortest prefix a query term can match on
+MAX_PREFIX_LENGTH = 20     # Longer keywords are indexed by their first 20 chars
+EXACT_MATCH_WEIGHT = 1     # Bonus per query term matching a whole keyword
+ACCESS_COUNT_WEIGHT = 0.5  # Popularity boost, applied to log10(access_count + 1)
+SEARCH_MAX_TIME_MS = 2000
+
+def build_index_document(file_id: str, file_name: str, file_type: str, file_size: int, caption: str = "", user_id: int = None) -> Dict:
+    """Sanitize a file's fields and build its search index document"""
 
     # Sanitize and validate inputs
     file_name = SecurityValidator.sanitize_filename(file_name)
@@ -24,50 +36,148 @@ async def add_to_index(file_id: str, file_name: str, file_type: str, file_size:
     # Extract keywords from filename and caption
     keywords = extract_keywords(file_name, caption)
 
-    document = {
+    return {
         "_id": file_id,
         "file_name": file_name,
         "file_type": file_type,
         "file_size": file_size,
         "caption": caption,
         "keywords": keywords,
+        "search_tokens": build_search_tokens(keywords),
         "user_id": user_id,
         "indexed_at": datetime.utcnow(),
         "access_count": 0
     }
 
-    await collection.replace_one({"_id": file_id}, document, upsert=True)
+def _index_upsert(document: Dict):
+    """
+    Filter and update that leave access_count and indexed_at of an existing file
+    alone, so re-indexing an unchanged file matches without modifying it (a duplicate).
+    """
+    fields = {k: v for k, v in document.items() if k not in ("_id", "indexed_at", "access_count")}
+    return (
+        {"_id": document["_id"]},
+        {"$set": fields, "$setOnInsert": {"indexed_at": document["indexed_at"], "access_count": document["access_count"]}}
+    )
+
+async def add_to_index(file_id: str, file_name: str, file_type: str, file_size: int, caption: str = "", user_id: int = None):
+    """Add a file to the search index"""
+    query, update = _index_upsert(build_index_document(file_id, file_name, file_type, file_size, caption, user_id))
+    await collection.update_one(query, update, upsert=True)
+
+async def bulk_index(documents: List[Dict]) -> Dict:
+    """
+    Upsert built index documents in one unordered bulk_write.
+    Returns counts of inserted, updated (changed) and duplicate (unchanged) files and errors.
+    """
+    counts = {"inserted": 0, "updated": 0, "duplicate": 0, "errors": 0}
+    if not documents:
+        return counts
+
+    try:
+        result = await collection.bulk_write(
+            [UpdateOne(*_index_upsert(doc), upsert=True) for doc in documents], ordered=False
+        )
+        details = {"nUpserted": result.upserted_count, "nMatched": result.matched_count,
+                   "nModified": result.modified_count, "writeErrors": []}
+    except BulkWriteError as e:
+        # Unordered: everything but the failed operations was still written
+        details = e.details
+
+    counts["inserted"] = details.get("nUpserted", 0)
+    counts["updated"] = details.get("nModified", 0)
+    counts["duplicate"] = details.get("nMatched", 0) - counts["updated"]
+    counts["errors"] = len(details.get("writeErrors", []))
+    return counts
 
 async def search_files(query: str, limit: int = 50) -> List[Dict]:
-    """Search files by query"""
+    """Search files by query using the prefix-expanded token index"""
     if not query.strip():
         return []
 
     # Sanitize search query
     sanitized_query = SecurityValidator.sanitize_search_query(query)
 
-    # Create search pattern
-    search_terms = sanitized_query.strip().split()
-    regex_patterns = []
-
-    for term in search_terms:
-        regex_patterns.append({"keywords": {"$regex": re.escape(term), "$options": "i"}})
+    # Tokenize the same way documents are tokenized at index time
+    search_terms = [term[:MAX_PREFIX_LENGTH] for term in extract_keywords(sanitized_query)]
+    if not search_terms:
+        return []
 
-    search_filter = {"$or": regex_patterns}
+    # Equality match on a multikey index: every lookup is an index seek, and
+    # a term like "avat" hits "avatar" because its prefixes are stored too
+    pipeline = [
+        {"$match": {"search_tokens": {"$in": search_terms}}},
+        {"$addFields": {
+            "_matched_terms": {"$size": {"$setIntersection": [{"$ifNull": ["$search_tokens", []]}, search_terms]}},
+            "_exact_terms": {"$size": {"$setIntersection": [{"$ifNull": ["$keywords", []]}, search_terms]}},
+        }},
+        {"$addFields": {
+            "_score": {"$add": [
+                "$_matched_terms",
+                {"$multiply": ["$_exact_terms", EXACT_MATCH_WEIGHT]},
+                {"$multiply": [{"$log10": {"$add": [{"$max": [{"$ifNull": ["$access_count", 0]}, 0]}, 1]}}, ACCESS_COUNT_WEIGHT]},
+            ]}
+        }},
+        {"$sort": {"_score": -1, "access_count": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": {"_matched_terms": 0, "_exact_terms": 0, "search_tokens": 0}},
+    ]
 
-    cursor = collection.find(search_filter).sort("indexed_at", -1).limit(limit)
+    cursor = collection.aggregate(pipeline, maxTimeMS=SEARCH_MAX_TIME_MS)
     return await cursor.to_list(length=limit)
 
-async def get_popular_files(limit: int = 20, offset: int = 0) -> List[Dict]:
-    """Get most accessed files with offset support"""
+def encode_page_cursor(doc: Dict, sort_field: str) -> Optional[str]:
+    """Build an opaque cursor pointing just past doc in a (sort_field, _id) ordering"""
+    if not doc:
+        return None
+
+    value = doc.get(sort_field)
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+
+    payload = json.dumps({"v": value, "id": doc.get("_id")}, separators=(",", ":"))
+    return encode(payload)
+
+def decode_page_cursor(cursor: str):
+    """Return (sort_value, _id) from a cursor made by encode_page_cursor"""
+    payload = json.loads(decode(cursor))
+    value = payload.get("v")
+    if isinstance(value, dict) and "$date" in value:
+        value = datetime.fromisoformat(value["$date"])
+    return value, payload.get("id")
+
+def _keyset_filter(sort_field: str, cursor: Optional[str]) -> Dict:
+    """Filter selecting documents after the cursor in descending (sort_field, _id) order"""
+    if not cursor:
+        return {}
+
     try:
-        print(f"DEBUG: Starting get_popular_files with limit={limit}, offset={offset}")
+        value, last_id = decode_page_cursor(cursor)
+    except Exception as e:
+        print(f"WARNING: Ignoring invalid page cursor: {e}")
+        return {}
+
+    # Missing sort values sort last, so past a null only the _id tie-break is left
+    if value is None:
+        return {sort_field: None, "_id": {"$lt": last_id}}
 
-        # Get files sorted by access count (most popular first) with offset
-        cursor = collection.find({}).sort("access_count", -1).skip(offset).limit(limit)
+    return {"$or": [
+        {sort_field: {"$lt": value}},
+        {sort_field: value, "_id": {"$lt": last_id}},
+        {sort_field: None},
+    ]}
+
+async def get_popular_files(limit: int = 20, cursor: Optional[str] = None) -> List[Dict]:
+    """Get most accessed files, continuing after cursor when given"""
+    try:
+        print(f"DEBUG: Starting get_popular_files with limit={limit}, cursor={'set' if cursor else 'none'}")
+
+        # Keyset pagination over the (access_count, _id) index - page N costs the same as page 1
+        cursor_filter = _keyset_filter("access_count", cursor)
+        db_cursor = collection.find(cursor_filter).sort([("access_count", -1), ("_id", -1)]).limit(limit)
 
         results = []
-        async for doc in cursor:
+        async for doc in db_cursor:
             # Validate document structure
             if not isinstance(doc, dict):
                 print(f"WARNING: Invalid document type: {type(doc)}")
@@ -85,23 +195,24 @@ async def get_popular_files(limit: int = 20, offset: int = 0) -> List[Dict]:
             print(f"DEBUG: Validated popular file: {file_name} (ID: {file_id}, Views: {access_count})")
             results.append(doc)
 
-        print(f"DEBUG: get_popular_files returning {len(results)} results with offset {offset}")
+        print(f"DEBUG: get_popular_files returning {len(results)} results")
         return results
 
     except Exception as e:
         print(f"ERROR: get_popular_files failed: {e}")
         return []
 
-async def get_recent_files(limit=10, offset=0):
-    """Get recent files from database with offset support"""
+async def get_recent_files(limit=10, cursor: Optional[str] = None):
+    """Get recently indexed files, continuing after cursor when given"""
     try:
-        print(f"DEBUG: Starting get_recent_files with limit={limit}, offset={offset}")
+        print(f"DEBUG: Starting get_recent_files with limit={limit}, cursor={'set' if cursor else 'none'}")
 
-        # Get files sorted by insertion order (most recent first) with offset
-        cursor = collection.find({}).sort([("_id", -1)]).skip(offset).limit(limit)
+        # Keyset pagination over the (indexed_at, _id) index - page N costs the same as page 1
+        cursor_filter = _keyset_filter("indexed_at", cursor)
+        db_cursor = collection.find(cursor_filter).sort([("indexed_at", -1), ("_id", -1)]).limit(limit)
 
         results = []
-        async for doc in cursor:
+        async for doc in db_cursor:
             # Validate document structure
             if not isinstance(doc, dict):
                 print(f"WARNING: Invalid document type: {type(doc)}")
@@ -118,7 +229,7 @@ async def get_recent_files(limit=10, offset=0):
             print(f"DEBUG: Validated recent file: {file_name} (ID: {file_id})")
             results.append(doc)
 
-        print(f"DEBUG: get_recent_files returning {len(results)} results with offset {offset}")
+        print(f"DEBUG: get_recent_files returning {len(results)} results")
         return results
 
     except Exception as e:
@@ -132,10 +243,52 @@ async def increment_access_count(file_id: str):
         {"$inc": {"access_count": 1}}
     )
 
+async def increment_access_counts(file_ids: List[str]):
+    """Increment access count for several files in one round-trip"""
+    if not file_ids:
+        return
+    await collection.update_many(
+        {"_id": {"$in": list(file_ids)}},
+        {"$inc": {"access_count": 1}}
+    )
+
 async def remove_from_index(file_id: str):
     """Remove a file from index"""
     await collection.delete_one({"_id": file_id})
 
+    # Drop the cached channel post too, so it is not served again
+    chat_part, _, message_part = str(file_id).rpartition("_")
+    try:
+        chat_id = int(chat_part) if chat_part else Config.INDEX_CHANNEL_ID
+        message_cache.invalidate(chat_id, int(message_part))
+    except ValueError:
+        pass
+
+async def remove_files_from_index(file_ids: List[str]) -> int:
+    """Remove several files from index in one delete_many; returns how many were removed"""
+    if not file_ids:
+        return 0
+    result = await collection.delete_many({"_id": {"$in": list(file_ids)}})
+
+    for file_id in file_ids:
+        chat_part, _, message_part = str(file_id).rpartition("_")
+        try:
+            message_cache.invalidate(int(chat_part), int(message_part))
+        except ValueError:
+            pass
+    return result.deleted_count
+
+async def sample_channel_file_ids(channel_id: int, size: int) -> List[str]:
+    """Random ids of up to size indexed files from channel_id"""
+    pipeline = [
+        # Anchored prefix regex on _id is an index range scan
+        {"$match": {"_id": {"$regex": f"^{int(channel_id)}_"}}},
+        {"$sample": {"size": size}},
+        {"$project": {"_id": 1}}
+    ]
+    docs = await collection.aggregate(pipeline).to_list(length=size)
+    return [doc["_id"] for doc in docs]
+
 async def get_index_stats() -> Dict:
     """Get indexing statistics"""
     total_files = await collection.count_documents({})
@@ -167,11 +320,50 @@ def extract_keywords(file_name: str, caption: str = "") -> List[str]:
     # Remove duplicates while preserving order
     return list(dict.fromkeys(keywords))
 
+def build_search_tokens(keywords: List[str]) -> List[str]:
+    """Expand keywords into the prefix tokens stored in the search index"""
+    tokens = []
+    for keyword in keywords:
+        keyword = keyword[:MAX_PREFIX_LENGTH]
+        for end in range(MIN_PREFIX_LENGTH, len(keyword) + 1):
+            tokens.append(keyword[:end])
+
+    # Remove duplicates while preserving order
+    return list(dict.fromkeys(tokens))
+
+async def backfill_search_tokens(batch_size: int = 500) -> int:
+    """Populate search_tokens for documents indexed before the field existed"""
+    updated = 0
+    cursor = collection.find(
+        {"search_tokens": {"$exists": False}},
+        {"keywords": 1, "file_name": 1, "caption": 1}
+    ).batch_size(batch_size)
+
+    batch = []
+    async for doc in cursor:
+        keywords = doc.get("keywords") or extract_keywords(doc.get("file_name", ""), doc.get("caption", ""))
+        batch.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"keywords": keywords, "search_tokens": build_search_tokens(keywords)}}
+        ))
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+
+    if updated:
+        print(f"DEBUG: Backfilled search tokens for {updated} indexed files")
+    return updated
+
 async def update_file_keywords(file_id: str, new_keywords: List[str]):
     """Update keywords for a file"""
     await collection.update_one(
         {"_id": file_id},
-        {"$set": {"keywords": new_keywords}}
+        {"$set": {"keywords": new_keywords, "search_tokens": build_search_tokens(new_keywords)}}
     )
 
 async def search_files_by_name(query: str, limit: int = 50) -> List[Dict]:
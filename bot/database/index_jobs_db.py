@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from .connection import db
+
+index_jobs_col = db["index_jobs"]
+# {_id: channel_id, "last_indexed_id": int}; newest message covered by a finished re-index
+index_marks_col = db["index_marks"]
+
+INDEX_JOB_COUNTERS = ("fetched", "saved", "duplicate", "deleted", "no_media", "unsupported", "errors", "index_errors")
+
+
+async def create_index_job(chat, status_chat_id: int, status_message_id: int, last_msg_id: int = 0, skip: int = 0,
+                           kind: str = "range", full: bool = False, queued: bool = False) -> dict:
+    """
+    Persist a new channel crawl. A "range" job fetches last_msg_id - skip down to
+    message 1; a "history" job reads chat history newest first down to the
+    channel's high-water mark (all of it if full). Queued jobs wait for an
+    indexing worker process to claim them.
+    """
+    counts = {counter: 0 for counter in INDEX_JOB_COUNTERS}
+    counts["fetched"] = skip
+    job = {
+        "_id": ObjectId(),
+        "kind": kind,
+        "chat": chat,
+        "full": full,
+        "last_msg_id": last_msg_id,
+        "next_id": last_msg_id - skip,
+        "status_chat_id": status_chat_id,
+        "status_message_id": status_message_id,
+        "state": "queued" if queued else "running",
+        "counts": counts,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+    await index_jobs_col.insert_one(job)
+    return job
+
+
+async def save_index_progress(job_id, next_id: int, counts: dict, **fields):
+    """Checkpoint a job: every message above next_id has been fetched and written"""
+    await index_jobs_col.update_one(
+        {"_id": job_id},
+        {"$set": {"next_id": next_id, "counts": counts, "updated_at": datetime.utcnow(), **fields}}
+    )
+
+
+async def finish_index_job(job_id, counts: dict, state: str = "done"):
+    await index_jobs_col.update_one(
+        {"_id": job_id},
+        {"$set": {"state": state, "counts": counts, "updated_at": datetime.utcnow(), "finished_at": datetime.utcnow()}}
+    )
+
+
+async def get_running_index_jobs() -> list:
+    """Jobs run by the bot itself that were still running when it stopped"""
+    return await index_jobs_col.find({"state": "running", "worker": {"$exists": False}}).to_list(length=None)
+
+
+async def find_active_index_job(chat) -> Optional[dict]:
+    """A queued or running job for chat, from any process"""
+    return await index_jobs_col.find_one({"chat": chat, "state": {"$in": ["queued", "running"]}})
+
+
+async def claim_index_job(worker: str, lease_seconds: int) -> Optional[dict]:
+    """
+    Hand the oldest queued job (or one whose worker stopped renewing its lease)
+    to worker. find_one_and_update makes the claim atomic across workers.
+    """
+    now = datetime.utcnow()
+    return await index_jobs_col.find_one_and_update(
+        {"$or": [
+            {"state": "queued"},
+            {"state": "running", "worker": {"$exists": True}, "leased_until": {"$lt": now}},
+        ]},
+        {"$set": {"state": "running", "worker": worker, "leased_until": now + timedelta(seconds=lease_seconds)}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def renew_index_leases(job_ids: list, worker: str, lease_seconds: int):
+    """Extend the leases worker holds, so other workers leave its jobs alone"""
+    if not job_ids:
+        return
+    await index_jobs_col.update_many(
+        {"_id": {"$in": job_ids}, "worker": worker},
+        {"$set": {"leased_until": datetime.utcnow() + timedelta(seconds=lease_seconds)}}
+    )
+
+
+async def request_index_cancel(job_id) -> bool:
+    """Cancel a job run by a worker: queued jobs end right away, running ones at the worker's next poll"""
+    result = await index_jobs_col.update_one(
+        {"_id": job_id, "state": "queued"},
+        {"$set": {"state": "cancelled", "updated_at": datetime.utcnow(), "finished_at": datetime.utcnow()}}
+    )
+    if result.modified_count:
+        return True
+    result = await index_jobs_col.update_one(
+        {"_id": job_id, "state": "running"},
+        {"$set": {"cancel_requested": True}}
+    )
+    return result.matched_count > 0
+
+
+async def get_cancel_requests(job_ids: list) -> set:
+    """Ids among job_ids that an admin asked to cancel"""
+    if not job_ids:
+        return set()
+    docs = await index_jobs_col.find({"_id": {"$in": job_ids}, "cancel_requested": True}, {"_id": 1}).to_list(length=None)
+    return {doc["_id"] for doc in docs}
+
+
+async def get_high_water_mark(channel_id: int) -> int:
+    """Newest message id of channel_id already indexed, or 0 if it never was"""
+    mark = await index_marks_col.find_one({"_id": channel_id})
+    return mark["last_indexed_id"] if mark else 0
+
+
+async def set_high_water_mark(channel_id: int, message_id: int):
+    """Record that every message of channel_id up to message_id is indexed; never moves backwards"""
+    await index_marks_col.update_one(
+        {"_id": channel_id},
+        {"$max": {"last_indexed_id": message_id}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
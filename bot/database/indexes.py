@@ -0,0 +1,106 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from .connection import db
+
+# Server error codes for an index that clashes with an existing one
+INDEX_CONFLICT_CODES = (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+
+# Every index the bot relies on, per collection. The _id index is implicit.
+INDEXES = {
+    "file_index": [
+        IndexModel([("search_tokens", ASCENDING)], name="search_tokens_1"),
+        IndexModel([("indexed_at", DESCENDING), ("_id", DESCENDING)], name="indexed_at_-1__id_-1"),
+        IndexModel([("access_count", DESCENDING), ("_id", DESCENDING)], name="access_count_-1__id_-1"),
+        IndexModel([("file_type", ASCENDING)], name="file_type_1"),
+    ],
+    "verified_tokens": [
+        IndexModel([("user_id", ASCENDING), ("token", ASCENDING)], name="user_id_1_token_1"),
+        # Mongo drops tokens on its own once they expire
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "premium_users": [
+        IndexModel([("is_active", ASCENDING)], name="is_active_1"),
+    ],
+    "schedule_delete": [
+        # Safety net for tasks the scheduler never cleaned up; a day of grace
+        # keeps tasks that are still due at startup available for recovery.
+        # Also serves the scheduler's due-task poll (run_time <= now, oldest first).
+        IndexModel([("run_time", ASCENDING)], name="run_time_ttl", expireAfterSeconds=86400),
+        IndexModel([("lease", ASCENDING)], name="lease_1", sparse=True),
+    ],
+    "index_jobs": [
+        # Worker claims (oldest queued first) and the one-job-per-chat check
+        IndexModel([("state", ASCENDING), ("created_at", ASCENDING)], name="state_1_created_at_1"),
+        IndexModel([("chat", ASCENDING), ("state", ASCENDING)], name="chat_1_state_1"),
+    ],
+}
+
+class IndexConflictError(Exception):
+    """Raised when a declared index clashes with one already on the server"""
+
+def _same_index(declared: dict, existing: dict) -> bool:
+    """Compare key pattern, TTL, sparse and unique"""
+    if list(declared["key"].items()) != [tuple(k) for k in existing.get("key", [])]:
+        return False
+    if declared.get("expireAfterSeconds") != existing.get("expireAfterSeconds"):
+        return False
+    # index_information only lists these flags when they are set
+    return all(bool(declared.get(option)) == bool(existing.get(option)) for option in ("sparse", "unique"))
+
+async def _index_usage(collection) -> dict:
+    """Return {index_name: ops} since the server started, or {} if not permitted"""
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+        return {stat["name"]: stat.get("accesses", {}).get("ops", 0) for stat in stats}
+    except Exception:
+        return {}
+
+async def ensure_indexes() -> dict:
+    """Idempotently create all declared indexes and report on the rest"""
+    report = {"created": [], "unused": []}
+
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+
+        missing = []
+        for model in models:
+            declared = model.document
+            current = existing.get(declared["name"])
+
+            if current is None:
+                # Same keys under another name would make create_indexes fail anyway
+                for other_name, other in existing.items():
+                    if [tuple(k) for k in other.get("key", [])] == list(declared["key"].items()):
+                        raise IndexConflictError(
+                            f"{collection_name}: index '{declared['name']}' already exists as '{other_name}'"
+                        )
+                missing.append(model)
+            elif not _same_index(declared, current):
+                raise IndexConflictError(
+                    f"{collection_name}: index '{declared['name']}' exists with a different definition: {current}"
+                )
+
+        if missing:
+            try:
+                await collection.create_indexes(missing)
+            except OperationFailure as e:
+                if e.code in INDEX_CONFLICT_CODES:
+                    raise IndexConflictError(f"{collection_name}: {e}") from e
+                raise
+            for model in missing:
+                report["created"].append(f"{collection_name}.{model.document['name']}")
+                print(f"✅ Created index {collection_name}.{model.document['name']}")
+
+        declared_names = {model.document["name"] for model in models} | {"_id_"}
+        undeclared = [name for name in existing if name not in declared_names]
+        if undeclared:
+            usage = await _index_usage(collection)
+            for name in undeclared:
+                report["unused"].append(f"{collection_name}.{name}")
+                ops = usage.get(name)
+                ops_text = f", {ops} ops since server start" if ops is not None else ""
+                print(f"⚠️ Index {collection_name}.{name} is not declared by the bot{ops_text}")
+
+    print(f"DEBUG: Index check complete - created {len(report['created'])}, undeclared {len(report['unused'])}")
+    return report
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from .connection import db
+from .entitlements import invalidate_entitlement
 
 premium_data = db['premium_users']
 
@@ -25,6 +26,7 @@ async def add_premium_user(user_id: int, plan_type: str, tokens: int):
             user_data, 
             upsert=True
         )
+        invalidate_entitlement(user_id)
 
         print(f"Premium user added: {user_id}, Plan: {plan_type}, Tokens: {tokens}")
         return True
@@ -49,6 +51,7 @@ async def is_premium_user(user_id: int) -> bool:
                 {'_id': user_id}, 
                 {'$set': {'is_active': True}}
             )
+            invalidate_entitlement(user_id)
         
         if 'tokens_remaining' not in user:
             user['tokens_remaining'] = 0
@@ -56,6 +59,7 @@ async def is_premium_user(user_id: int) -> bool:
                 {'_id': user_id}, 
                 {'$set': {'tokens_remaining': 0}}
             )
+            invalidate_entitlement(user_id)
 
         if not user['is_active']:
             return False
@@ -68,6 +72,7 @@ async def is_premium_user(user_id: int) -> bool:
                     {'_id': user_id}, 
                     {'$set': {'is_active': False}}
                 )
+                invalidate_entitlement(user_id)
                 return False
             return True
 
@@ -80,6 +85,7 @@ async def is_premium_user(user_id: int) -> bool:
                 {'_id': user_id}, 
                 {'$set': {'is_active': False}}
             )
+            invalidate_entitlement(user_id)
             return False
 
     except Exception:
@@ -88,6 +94,7 @@ async def is_premium_user(user_id: int) -> bool:
             {'_id': user_id}, 
             {'$set': {'is_active': False}}
         )
+        invalidate_entitlement(user_id)
         return False
 
 async def get_premium_info(user_id: int):
@@ -119,6 +126,7 @@ async def get_premium_info(user_id: int):
                 {'_id': user_id},
                 {'$set': {'expiry_date': expiry_date}}
             )
+            invalidate_entitlement(user_id)
             user['expiry_date'] = expiry_date
 
         return user
@@ -127,23 +135,23 @@ async def get_premium_info(user_id: int):
 
 async def use_premium_token(user_id: int) -> bool:
     """Use one premium token, returns True if token was used successfully"""
-    user = await premium_data.find_one({'_id': user_id})
-    if not user or not user.get('is_active'):
-        return False
-
-    # Unlimited users don't use tokens
-    if user.get('tokens_remaining') == -1:
-        return True
-
-    # Check if user has tokens
-    if user.get('tokens_remaining', 0) > 0:
-        await premium_data.update_one(
-            {'_id': user_id},
-            {'$inc': {'tokens_remaining': -1}}
-        )
-        return True
-
-    return False
+    # Single conditional update: token plans are decremented only while they have
+    # tokens left, unlimited plans (-1) match only until they expire and stay at -1
+    result = await premium_data.find_one_and_update(
+        {
+            '_id': user_id,
+            'is_active': {'$ne': False},
+            '$or': [
+                {'tokens_remaining': {'$gt': 0}},
+                {'tokens_remaining': -1, 'expiry_date': {'$not': {'$lt': datetime.utcnow()}}}
+            ]
+        },
+        [{'$set': {'tokens_remaining': {
+            '$cond': [{'$eq': ['$tokens_remaining', -1]}, -1, {'$subtract': ['$tokens_remaining', 1]}]
+        }}}]
+    )
+    invalidate_entitlement(user_id)
+    return result is not None
 
 async def remove_premium(user_id: int):
     """Remove premium membership"""
@@ -151,6 +159,7 @@ async def remove_premium(user_id: int):
         {'_id': user_id}, 
         {'$set': {'is_active': False}}
     )
+    invalidate_entitlement(user_id)
 
 async def get_all_premium_users():
     """Get all premium users"""
@@ -19,21 +19,35 @@ async def add_user(user_id: int):
         raise e  # Re-raise other exceptions
 
 
-async def full_userbase():
-    user_ids = []
-    async for doc in user_data.find():
-        user_ids.append(doc['_id'])
-    return user_ids
+async def full_userbase() -> list:
+    """Every user id; fetches only _id. Page with get_user_ids_after for large userbases"""
+    return [doc['_id'] async for doc in user_data.find({}, {'_id': 1})]
+
+
+async def get_user_ids_after(after_id=None, limit: int = 500) -> list:
+    """One page of user ids in _id order, starting after after_id"""
+    query = {'_id': {'$gt': after_id}} if after_id is not None else {}
+    cursor = user_data.find(query, {'_id': 1}).sort('_id', 1).limit(limit)
+    return [doc['_id'] async for doc in cursor]
 
 
 async def del_user(user_id: int):
     await user_data.delete_one({'_id': user_id})
 
 
+async def del_users(user_ids: list) -> int:
+    """Delete many users in one round-trip, returning how many were removed"""
+    if not user_ids:
+        return 0
+    result = await user_data.delete_many({'_id': {'$in': list(user_ids)}})
+    return result.deleted_count
+
+
 async def get_users_count():
     """Get total count of users"""
     try:
-        count = await user_data.count_documents({})
+        # Collection metadata, no scan; the users collection has no filter to apply
+        count = await user_data.estimated_document_count()
         return count
     except Exception as e:
         print(f"Error getting users count: {e}")
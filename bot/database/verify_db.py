@@ -2,6 +2,7 @@ import secrets
 from datetime import datetime, timedelta
 
 from .connection import db
+from .entitlements import invalidate_entitlement
 
 users_col = db["verified_users"]
 tokens_col = db["verified_tokens"]
@@ -24,6 +25,7 @@ async def set_verified(user_id: int):
         {"$set": {"is_verified": True}},
         upsert=True
     )
+    invalidate_entitlement(user_id)
 
 async def is_verified(user_id: int) -> bool:
     user = await users_col.find_one({"_id": user_id})
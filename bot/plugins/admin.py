@@ -4,8 +4,8 @@ from info import Config
 from bot.database import add_premium_user, remove_premium, get_users_count
 from bot.database.premium_db import get_all_premium_users
 from bot.plugins.premium import PREMIUM_PLANS
+from bot.utils.channels import channel_store
 import os
-import asyncio
 from dotenv import set_key, load_dotenv
 
 # Admin verification decorator
@@ -83,19 +83,11 @@ async def add_force_channel(client: Client, message: Message):
         set_key(".env", "FORCE_SUB_CHANNEL", channel_list)
         Config.FORCE_SUB_CHANNEL = list(current_channels)
 
-        # Update bot's channel info
+        # Update the channel metadata store
         try:
-            if not chat.invite_link:
-                invite_link = await client.export_chat_invite_link(channel_id)
-            else:
-                invite_link = chat.invite_link
-
-            client.channel_info[channel_id] = {
-                'title': channel_title,
-                'invite_link': invite_link
-            }
-        except:
-            pass
+            await channel_store.load(client, channel_id, chat=chat)
+        except Exception as e:
+            print(f"WARNING: Could not load channel info for {channel_id}: {e}")
 
         await message.reply_text(f"✅ Added force subscription channel: **{channel_title}** (`{channel_id}`)")
 
@@ -126,9 +118,11 @@ async def remove_force_channel(client: Client, message: Message):
         set_key(".env", "FORCE_SUB_CHANNEL", channel_list)
         Config.FORCE_SUB_CHANNEL = list(current_channels)
 
-        # Remove from bot's channel info
-        if channel_id in client.channel_info:
-            del client.channel_info[channel_id]
+        # Remove from the channel metadata store
+        channel_store.remove(channel_id)
+
+        from bot.utils.membership import membership_cache
+        membership_cache.invalidate_chat(channel_id)
 
         await message.reply_text(f"✅ Removed force subscription channel: `{channel_id}`")
 
@@ -146,16 +140,7 @@ async def list_force_channels(client: Client, message: Message):
 
     text = "📢 **Force Subscription Channels:**\n\n"
     for i, channel_id in enumerate(Config.FORCE_SUB_CHANNEL, 1):
-        try:
-            if channel_id in client.channel_info:
-                title = client.channel_info[channel_id]['title']
-            else:
-                chat = await client.get_chat(channel_id)
-                title = chat.title or f"Channel {channel_id}"
-
-            text += f"{i}. **{title}**\n   ID: `{channel_id}`\n\n"
-        except:
-            text += f"{i}. **Unknown Channel**\n   ID: `{channel_id}`\n\n"
+        text += f"{i}. **{channel_store.title(channel_id)}**\n   ID: `{channel_id}`\n\n"
 
     await message.reply_text(text)
 
@@ -186,6 +171,12 @@ async def add_request_channel(client: Client, message: Message):
         set_key(".env", "REQUEST_CHANNEL", channel_list)
         Config.REQUEST_CHANNEL = list(current_channels)
 
+        # Update the channel metadata store
+        try:
+            await channel_store.load(client, channel_id, chat=chat, export_link=False)
+        except Exception as e:
+            print(f"WARNING: Could not load channel info for {channel_id}: {e}")
+
         await message.reply_text(f"✅ Added request approval channel: **{channel_title}** (`{channel_id}`)")
 
     except ValueError:
@@ -197,7 +188,36 @@ async def add_request_channel(client: Client, message: Message):
 @admin_only
 async def remove_request_channel(client: Client, message: Message):
     """Remove request approval channel"""
+    if len(message.command) < 2:
+        return await message.reply_text("❌ Usage: `/removerequest <channel_id>`")
+
+    try:
+        channel_id = int(message.command[1])
+
+        current_channels = set(getattr(Config, 'REQUEST_CHANNEL', []))
+        if channel_id not in current_channels:
+            return await message.reply_text(f"❌ Channel {channel_id} is not in request approval list.")
+
+        # Update config
+        current_channels.discard(channel_id)
+        channel_list = " ".join(str(ch) for ch in current_channels)
+
+        # Update .env file
+        set_key(".env", "REQUEST_CHANNEL", channel_list)
+        Config.REQUEST_CHANNEL = list(current_channels)
+
+        # Remove from the channel metadata store
+        channel_store.remove(channel_id)
 
+        from bot.utils.membership import membership_cache
+        membership_cache.invalidate_chat(channel_id)
+
+        await message.reply_text(f"✅ Removed request approval channel: `{channel_id}`")
+
+    except ValueError:
+        await message.reply_text("❌ Invalid channel ID.")
+    except Exception as e:
+        await message.reply_text(f"❌ Error removing request channel: {str(e)}")
 
 @Client.on_message(filters.command("checkpremium") & filters.private)
 @admin_only
@@ -234,31 +254,6 @@ async def check_premium_status(client: Client, message: Message):
     except Exception as e:
         await message.reply_text(f"❌ Error: {e}")
 
-    if len(message.command) < 2:
-        return await message.reply_text("❌ Usage: `/removerequest <channel_id>`")
-
-    try:
-        channel_id = int(message.command[1])
-
-        current_channels = set(getattr(Config, 'REQUEST_CHANNEL', []))
-        if channel_id not in current_channels:
-            return await message.reply_text(f"❌ Channel {channel_id} is not in request approval list.")
-
-        # Update config
-        current_channels.discard(channel_id)
-        channel_list = " ".join(str(ch) for ch in current_channels)
-
-        # Update .env file
-        set_key(".env", "REQUEST_CHANNEL", channel_list)
-        Config.REQUEST_CHANNEL = list(current_channels)
-
-        await message.reply_text(f"✅ Removed request approval channel: `{channel_id}`")
-
-    except ValueError:
-        await message.reply_text("❌ Invalid channel ID.")
-    except Exception as e:
-        await message.reply_text(f"❌ Error removing request channel: {str(e)}")
-
 @Client.on_message(filters.command("listrequest") & filters.private)
 @admin_only
 async def list_request_channels(client: Client, message: Message):
@@ -269,12 +264,7 @@ async def list_request_channels(client: Client, message: Message):
 
     text = "🔔 **Request Approval Channels:**\n\n"
     for i, channel_id in enumerate(request_channels, 1):
-        try:
-            chat = await client.get_chat(channel_id)
-            title = chat.title or f"Channel {channel_id}"
-            text += f"{i}. **{title}**\n   ID: `{channel_id}`\n\n"
-        except:
-            text += f"{i}. **Unknown Channel**\n   ID: `{channel_id}`\n\n"
+        text += f"{i}. **{channel_store.title(channel_id)}**\n   ID: `{channel_id}`\n\n"
 
     await message.reply_text(text)
 
@@ -377,6 +367,13 @@ async def bot_stats(client: Client, message: Message):
 
         premium_rate = (premium_count/total_users*100) if total_users > 0 else 0
 
+        from bot.utils.delivery import delivery_engine
+        from bot.utils.command_verification import user_locks
+        lock_stats = user_locks.stats()
+        delivery_text = ""
+        for mode, stats in delivery_engine.metrics.snapshot().items():
+            delivery_text += f"• {mode.title()}: {stats['files_sent']} files / {stats['requests']} requests, {stats['errors']} errors, avg {stats['avg_seconds']:.1f}s\n"
+
         stats_text = f"""
 📊 **Bot Statistics**
 
@@ -386,6 +383,9 @@ async def bot_stats(client: Client, message: Message):
 📢 **Force Sub Channels:** {len(Config.FORCE_SUB_CHANNEL)}
 🔔 **Request Channels:** {len(getattr(Config, 'REQUEST_CHANNEL', []))}
 
+📦 **Deliveries (since restart):**
+{delivery_text or "• None yet"}
+🔒 **User Locks:** {lock_stats['live']} live ({lock_stats['in_use']} in use, {lock_stats['evicted']} evicted)
 🤖 **System Status:** Online ✅
         """
         await message.reply_text(stats_text)
@@ -486,31 +486,12 @@ async def broadcast_message(client: Client, message: Message):
     try:
         broadcast_text = message.text.split(None, 1)[1]
 
-        from bot.database import full_userbase
-        users = await full_userbase()
-
-        if not users:
+        from bot.database import get_users_count
+        if not await get_users_count():
             return await message.reply_text("❌ No users found in database.")
 
-        status_msg = await message.reply_text(f"📢 Broadcasting to {len(users)} users...")
-
-        success_count = 0
-        failed_count = 0
-
-        for user_id in users:
-            try:
-                await client.send_message(user_id, broadcast_text)
-                success_count += 1
-                await asyncio.sleep(0.1)  # Avoid rate limits
-            except Exception:
-                failed_count += 1
-
-        await status_msg.edit_text(
-            f"📢 **Broadcast Complete**\n\n"
-            f"✅ **Successful:** {success_count}\n"
-            f"❌ **Failed:** {failed_count}\n"
-            f"📊 **Total:** {len(users)}"
-        )
+        from bot.utils.broadcast import broadcast_engine
+        await broadcast_engine.start(client, message, {"type": "text", "text": broadcast_text})
 
     except Exception as e:
         await message.reply_text(f"❌ Error during broadcast: {str(e)}")
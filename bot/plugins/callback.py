@@ -36,11 +36,12 @@ async def my_stats_callback(client, query: CallbackQuery):
         user_id = query.from_user.id
 
         from bot.database import get_command_stats
-        from bot.utils.command_verification import check_command_limit
+        from bot.database.entitlements import get_entitlement
 
         stats = await get_command_stats(user_id)
-        needs_verification, remaining = await check_command_limit(user_id)
-        is_premium = await is_premium_user(user_id)
+        entitlement = await get_entitlement(user_id)
+        needs_verification, remaining = entitlement.command_status()
+        is_premium = entitlement.is_premium
 
         # Determine status text based on user type
         if user_id in Config.ADMINS or user_id == Config.OWNER_ID:
@@ -8,7 +8,8 @@ import logging
 
 from info import Config
 from bot.utils import encode
-from bot.database import add_to_index
+from bot.utils.message_cache import message_cache
+from bot.utils.indexer import index_writer, index_jobs
 
 logger = logging.getLogger(__name__)
 
@@ -57,8 +58,8 @@ async def auto_index_files(client: Client, message: Message):
         # Use consistent file ID format
         unique_file_id = f"{client.db_channel.id}_{post_message.id}"
 
-        # Add to search index
-        await add_to_index(
+        # Add to search index, writing it now so the reply reflects the result
+        await index_writer.add(
             file_id=unique_file_id,
             file_name=file_name,
             file_type=media_type,
@@ -66,6 +67,9 @@ async def auto_index_files(client: Client, message: Message):
             caption=message.caption or '',
             user_id=message.from_user.id
         )
+        batch = await index_writer.flush()
+        if batch["errors"] and not (batch["inserted"] or batch["updated"] or batch["duplicate"]):
+            raise RuntimeError("database write failed")
 
         await reply_text.edit_text(f"✅ File indexed successfully!\n\n📁 **File**: {file_name}\n📊 **Type**: {media_type}\n💾 **Size**: {file_size} bytes")
         print(f"✅ Indexed file {post_message.id} to database")
@@ -151,14 +155,8 @@ async def auto_index_media(client: Client, message: Message):
             # Use unique message ID for indexing
             unique_file_id = f"{Config.INDEX_CHANNEL_ID}_{message.id}"
 
-            # Check for existing file before adding
-            from bot.database.index_db import collection
-            existing_file = await collection.find_one({"_id": unique_file_id})
-            if existing_file:
-                print(f"⚠️ File {unique_file_id} already exists in index, skipping")
-                return
-
-            await add_to_index(
+            # Buffered with other new posts; an existing file keeps its access count
+            await index_writer.add(
                 file_id=unique_file_id,
                 file_name=file_name,
                 file_type=media_type,
@@ -167,19 +165,12 @@ async def auto_index_media(client: Client, message: Message):
                 user_id=message.from_user.id if message.from_user else 0
             )
 
-            print(f"✅ Auto-indexed {media_type} file {message.id} from indexing channel")
+            print(f"✅ Queued {media_type} file {message.id} from indexing channel for indexing")
 
         except Exception as e:
             logger.exception(f"❌ Error auto-indexing from indexing channel: {e}")
             print(f"❌ Error auto-indexing from indexing channel: {e}")
 
-# Temporary storage for indexing state
-class IndexTemp:
-    CURRENT = 0
-    CANCEL = False
-
-temp = IndexTemp()
-
 @Client.on_message(filters.private & filters.user(Config.ADMINS) & filters.command("debug"))
 async def debug_message(client: Client, message: Message):
     """Debug command to check message properties"""
@@ -271,10 +262,12 @@ async def manual_index_channel(client: Client, message: Message):
         if len(message.command) < 2:
             return await message.reply_text(
                 "❌ Please provide channel ID or username!\n\n"
-                "Usage: `/indexchannel @channelname` or `/indexchannel -1001234567890`"
+                "Usage: `/indexchannel @channelname` or `/indexchannel -1001234567890`\n"
+                "Add `full` to re-index files that were already indexed."
             )
 
         channel_input = message.command[1]
+        full = len(message.command) > 2 and message.command[2].lower() == "full"
 
         # Try to get channel info
         try:
@@ -305,7 +298,7 @@ async def manual_index_channel(client: Client, message: Message):
         )
 
         # Start the indexing process
-        await index_channel_files(client, confirm_msg, channel_id)
+        await index_channel_files(client, confirm_msg, channel_id, full=full)
 
     except Exception as e:
         await message.reply_text(f"❌ Error: {str(e)}")
@@ -320,134 +313,16 @@ async def set_skip_number(client: Client, message: Message):
         except:
             return await message.reply_text("Skip number should be an integer.")
         await message.reply_text(f"Successfully set SKIP number to {skip}")
-        temp.CURRENT = int(skip)
+        index_jobs.skip = int(skip)
     else:
         await message.reply_text("Give me a skip number")
 
-async def index_channel_files(client: Client, message: Message, channel_id: int):
-    """Index all media files from a channel using get_messages (bot-compatible)"""
-
-    total_files = 0
-    duplicate_files = 0
-    errors = 0
-    deleted = 0
-    no_media = 0
-    unsupported = 0
-
-    try:
-        # Get channel info
-        channel = await client.get_chat(channel_id)
-
-        # Start indexing from latest messages
-        current = 0
-        async for msg in client.get_chat_history(channel_id):
-            if temp.CANCEL:
-                await message.edit_text(
-                    f"❌ Indexing cancelled!\n\n"
-                    f"📊 **Statistics:**\n"
-                    f"• Files indexed: {total_files}\n"
-                    f"• Duplicates skipped: {duplicate_files}\n"
-                    f"• Deleted messages: {deleted}\n"
-                    f"• Non-media messages: {no_media}\n"
-                    f"• Errors: {errors}"
-                )
-                break
-
-            current += 1
-
-            # Update progress every 50 messages
-            if current % 50 == 0:
-                await message.edit_text(
-                    f"🔍 **Indexing in progress...**\n\n"
-                    f"📊 **Current Statistics:**\n"
-                    f"• Messages processed: {current}\n"
-                    f"• Files indexed: {total_files}\n"
-                    f"• Duplicates skipped: {duplicate_files}\n"
-                    f"• Non-media messages: {no_media}\n"
-                    f"• Errors: {errors}",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("❌ Cancel", callback_data="index_cancel")]
-                    ])
-                )
-
-            if msg.empty:
-                deleted += 1
-                continue
-
-            if not msg.media:
-                no_media += 1
-                continue
-
-            # Only index video, document, photo, audio
-            if not (msg.video or msg.document or msg.photo or msg.audio):
-                unsupported += 1
-                continue
-
-            try:
-                # Determine file info
-                media_type = "unknown"
-                file_size = 0
-                file_name = msg.caption or f"File_{msg.id}"
-
-                if msg.video:
-                    media_type = "video"
-                    file_size = msg.video.file_size or 0
-                    if msg.video.file_name:
-                        file_name = msg.video.file_name
-                elif msg.document:
-                    media_type = "document"
-                    file_size = msg.document.file_size or 0
-                    if msg.document.file_name:
-                        file_name = msg.document.file_name
-                elif msg.photo:
-                    media_type = "photo"
-                    file_size = getattr(msg.photo, 'file_size', 0)
-                elif msg.audio:
-                    media_type = "audio"
-                    file_size = msg.audio.file_size or 0
-                    if msg.audio.file_name:
-                        file_name = msg.audio.file_name
-
-                # Create unique file ID
-                unique_file_id = f"{channel_id}_{msg.id}"
-
-                # Add to index
-                await add_to_index(
-                    file_id=unique_file_id,
-                    file_name=file_name,
-                    file_type=media_type,
-                    file_size=file_size,
-                    caption=msg.caption or '',
-                    user_id=msg.from_user.id if msg.from_user else 0
-                )
-
-                total_files += 1
-
-            except Exception as e:
-                print(f"Error indexing message {msg.id}: {e}")
-                errors += 1
-
-        # Final status
-        await message.edit_text(
-            f"✅ **Indexing completed!**\n\n"
-            f"📊 **Final Statistics:**\n"
-            f"• Messages processed: {current}\n"
-            f"• Files indexed: {total_files}\n"
-            f"• Duplicates skipped: {duplicate_files}\n"
-            f"• Deleted messages: {deleted}\n"
-            f"• Non-media messages: {no_media + unsupported}\n"
-            f"• Errors: {errors}"
-        )
-
-    except Exception as e:
-        logger.exception(f"Error during channel indexing: {e}")
-        await message.edit_text(f"❌ Error during indexing: {str(e)}")
-
-@Client.on_callback_query(filters.regex(r"^index_cancel"))
-async def cancel_indexing(client: Client, query):
-    """Cancel ongoing indexing process"""
-    temp.CANCEL = True
-    await query.answer("Indexing process cancelled!", show_alert=True)
+async def index_channel_files(client: Client, message: Message, channel_id: int, full: bool = False):
+    """Index media files of a channel posted after its last re-index (every file if full)"""
+    # Runs as a background job (or on the indexing worker), reporting on message
+    job = await index_jobs.start(client, channel_id, message, kind="history", full=full)
+    if job is None:
+        await message.edit_text("⏳ This channel is already being indexed.")
 
 @Client.on_message(filters.channel & filters.incoming & filters.chat(Config.CHANNEL_ID))
 async def new_post(client: Client, message: Message):
@@ -483,8 +358,8 @@ async def new_post(client: Client, message: Message):
             # Use unique message ID for indexing
             unique_file_id = f"{Config.CHANNEL_ID}_{message.id}"
 
-            # Add to index
-            await add_to_index(
+            # Add to index (buffered with other new posts)
+            await index_writer.add(
                 file_id=unique_file_id,
                 file_name=file_name,
                 file_type=media_type,
@@ -493,7 +368,7 @@ async def new_post(client: Client, message: Message):
                 user_id=message.from_user.id if message.from_user else 0
             )
 
-            print(f"✅ Auto-indexed {media_type} file {message.id} from main storage channel")
+            print(f"✅ Queued {media_type} file {message.id} from main storage channel for indexing")
 
         except Exception as e:
             print(f"❌ Error auto-indexing from main channel: {e}")
@@ -511,4 +386,16 @@ async def new_post(client: Client, message: Message):
         await asyncio.sleep(e.value)
         await message.edit_reply_markup(reply_markup)
     except Exception:
-        pass
\ No newline at end of file
+        pass
+
+@Client.on_edited_message(filters.channel & filters.chat([Config.CHANNEL_ID, Config.INDEX_CHANNEL_ID]))
+async def invalidate_edited_post(client: Client, message: Message):
+    """Drop edited storage channel posts from the message cache"""
+    message_cache.invalidate(message.chat.id, message.id)
+
+@Client.on_deleted_messages(filters.chat([Config.CHANNEL_ID, Config.INDEX_CHANNEL_ID]))
+async def invalidate_deleted_posts(client: Client, messages):
+    """Drop deleted storage channel posts from the message cache"""
+    for message in messages:
+        if message.chat:
+            message_cache.invalidate(message.chat.id, message.id)
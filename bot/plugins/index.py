@@ -1,32 +1,25 @@
 
 import logging
-import asyncio
 from pyrogram import Client, filters, enums
-from pyrogram.errors import FloodWait, ChannelInvalid, ChatAdminRequired, UsernameInvalid, UsernameNotModified
+from pyrogram.errors import ChannelInvalid, ChatAdminRequired, UsernameInvalid, UsernameNotModified
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
 from info import Config
-from bot.database import add_to_index
 import re
+from bot.utils.indexer import index_jobs
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-lock = asyncio.Lock()
 
-# Temporary storage for indexing state
-class IndexTemp:
-    CURRENT = 0
-    CANCEL = False
-
-temp = IndexTemp()
-
-@Client.on_callback_query(filters.regex(r'^index'), group=0)
+@Client.on_callback_query(filters.regex(r'^index(#|_cancel#)'), group=0)
 async def index_files(bot, query):
     # Security check: Only admins can perform indexing
     if query.from_user.id not in Config.ADMINS:
         return await query.answer("❌ Unauthorized access!", show_alert=True)
         
     if query.data.startswith('index_cancel'):
-        temp.CANCEL = True
+        _, job_id = query.data.split("#")
+        if not await index_jobs.cancel(job_id):
+            return await query.answer("This indexing job is no longer running.", show_alert=True)
         return await query.answer("Cancelling Indexing")
     
     _, action, chat, lst_msg_id, from_user = query.data.split("#")
@@ -38,8 +31,14 @@ async def index_files(bot, query):
                                reply_to_message_id=int(lst_msg_id))
         return
 
-    if lock.locked():
-        return await query.answer('Wait until previous process complete.', show_alert=True)
+    try:
+        chat = int(chat)
+    except:
+        chat = chat
+
+    # One job per chat; other chats can be indexed at the same time
+    if await index_jobs.is_indexing(chat):
+        return await query.answer('This chat is already being indexed.', show_alert=True)
     
     msg = query.message
     await query.answer('Processing...⏳', show_alert=True)
@@ -49,19 +48,8 @@ async def index_files(bot, query):
                                f'Your submission for indexing {chat} has been accepted and will be added soon.',
                                reply_to_message_id=int(lst_msg_id))
     
-    await msg.edit(
-        "Starting Indexing",
-        reply_markup=InlineKeyboardMarkup(
-            [[InlineKeyboardButton('Cancel', callback_data='index_cancel')]]
-        )
-    )
-    
-    try:
-        chat = int(chat)
-    except:
-        chat = chat
-    
-    await index_files_to_db(int(lst_msg_id), chat, msg, bot)
+    # Runs in the background, checkpointed so a restart resumes it
+    await index_jobs.start(bot, chat, msg, last_msg_id=int(lst_msg_id))
 
 @Client.on_message((filters.forwarded | (filters.regex(r"(https://)?(t\.me/|telegram\.me/|telegram\.dog/)(c/)?(\d+|[a-zA-Z_0-9]+)/(\d+)$")) & filters.text) & filters.private & filters.incoming)
 async def send_for_index(bot, message):
@@ -166,7 +154,7 @@ Forward any message from @your_channel or send:
 The bot will then ask for confirmation and start indexing all files from that channel.
 
 **Current Skip Number:** {skip}
-    """.format(skip=temp.CURRENT)
+    """.format(skip=index_jobs.skip)
     
     await message.reply_text(help_text)
 
@@ -184,117 +172,10 @@ async def set_skip_number(bot, message):
         if skip_num < 0:
             return await message.reply_text("❌ Skip number must be a positive integer.")
         
-        temp.CURRENT = skip_num
+        index_jobs.skip = skip_num
         await message.reply_text(f"✅ Successfully set SKIP number to **{skip_num}**\n\nThis means indexing will start from message {skip_num} from the latest message.")
         
     except ValueError:
         await message.reply_text("❌ Invalid number. Please provide a valid integer.")
     except Exception as e:
         await message.reply_text(f"❌ Error setting skip number: {str(e)}")
-
-async def index_files_to_db(lst_msg_id, chat, msg, bot):
-    total_files = 0
-    duplicate = 0
-    errors = 0
-    deleted = 0
-    no_media = 0
-    unsupported = 0
-    current = temp.CURRENT
-    
-    async with lock:
-        try:
-            temp.CANCEL = False
-            
-            # Start from the latest message and work backwards
-            # We'll get messages in batches using get_messages
-            while not temp.CANCEL:
-                try:
-                    # Calculate the message ID to fetch
-                    fetch_msg_id = lst_msg_id - current
-                    
-                    if fetch_msg_id <= 0:
-                        break
-                    
-                    # Try to get the message
-                    try:
-                        message = await bot.get_messages(chat, fetch_msg_id)
-                    except:
-                        current += 1
-                        deleted += 1
-                        continue
-                    
-                    if not message or message.empty:
-                        current += 1
-                        deleted += 1
-                        continue
-                    
-                    current += 1
-                    
-                    # Update status every 20 messages
-                    if current % 20 == 0:
-                        can = [[InlineKeyboardButton('Cancel', callback_data='index_cancel')]]
-                        reply = InlineKeyboardMarkup(can)
-                        await msg.edit_text(
-                            text=f"Total messages fetched: <code>{current}</code>\n"
-                                 f"Total messages saved: <code>{total_files}</code>\n"
-                                 f"Duplicate Files Skipped: <code>{duplicate}</code>\n"
-                                 f"Deleted Messages Skipped: <code>{deleted}</code>\n"
-                                 f"Non-Media messages skipped: <code>{no_media + unsupported}</code>\n"
-                                 f"Errors Occurred: <code>{errors}</code>",
-                            reply_markup=reply)
-                    
-                    # Check if message has media
-                    if not message.media:
-                        no_media += 1
-                        continue
-                    elif message.media not in [enums.MessageMediaType.VIDEO, enums.MessageMediaType.AUDIO, enums.MessageMediaType.DOCUMENT]:
-                        unsupported += 1
-                        continue
-                    
-                    media = getattr(message, message.media.value, None)
-                    if not media:
-                        unsupported += 1
-                        continue
-                    
-                    # Extract file information
-                    file_name = getattr(media, 'file_name', None) or message.caption or f"File_{message.id}"
-                    file_size = getattr(media, 'file_size', 0)
-                    file_type = message.media.value
-                    caption = message.caption or ''
-                    
-                    try:
-                        # Create a unique file ID using chat and message ID
-                        unique_file_id = f"{chat}_{message.id}"
-                        
-                        # Add to our index database
-                        await add_to_index(
-                            file_id=unique_file_id,
-                            file_name=file_name,
-                            file_type=file_type,
-                            file_size=file_size,
-                            caption=caption,
-                            user_id=message.from_user.id if message.from_user else 0
-                        )
-                        total_files += 1
-                    except Exception as e:
-                        logger.exception(f"Error indexing file {message.id}: {e}")
-                        errors += 1
-                        
-                except FloodWait as e:
-                    await asyncio.sleep(e.x)
-                    continue
-                except Exception as e:
-                    logger.exception(f"Error processing message: {e}")
-                    errors += 1
-                    current += 1
-                    continue
-                    
-        except Exception as e:
-            logger.exception(e)
-            await msg.edit(f'Error: {e}')
-        else:
-            await msg.edit(f'Successfully saved <code>{total_files}</code> files to database!\n'
-                           f'Duplicate Files Skipped: <code>{duplicate}</code>\n'
-                           f'Deleted Messages Skipped: <code>{deleted}</code>\n'
-                           f'Non-Media messages skipped: <code>{no_media + unsupported}</code>\n'
-                           f'Errors Occurred: <code>{errors}</code>')
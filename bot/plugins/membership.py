@@ -0,0 +1,28 @@
+from pyrogram import Client, filters
+from pyrogram.types import ChatMemberUpdated, ChatJoinRequest
+
+from info import Config
+from bot.utils.membership import membership_cache, JOIN_REQUESTED
+
+
+async def _is_subscription_channel(_, __, update) -> bool:
+    # Read Config on every update so /addforce and /addrequest apply immediately
+    return update.chat.id in Config.FORCE_SUB_CHANNEL or update.chat.id in getattr(Config, 'REQUEST_CHANNEL', [])
+
+subscription_channel = filters.create(_is_subscription_channel)
+
+
+@Client.on_chat_member_updated(subscription_channel)
+async def refresh_member_status(client: Client, update: ChatMemberUpdated):
+    """Keep the membership cache in step with joins, leaves, bans and promotions"""
+    member = update.new_chat_member or update.old_chat_member
+    if not member or not member.user:
+        return
+    status = update.new_chat_member.status if update.new_chat_member else None
+    membership_cache.set(update.chat.id, member.user.id, status)
+
+
+@Client.on_chat_join_request(subscription_channel)
+async def record_join_request(client: Client, request: ChatJoinRequest):
+    """A pending join request counts as joined for request channels"""
+    membership_cache.set(request.chat.id, request.from_user.id, JOIN_REQUESTED)
@@ -1,13 +1,30 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton
-from bot.database import get_random_files, get_popular_files, get_recent_files, get_index_stats, increment_access_count, is_premium_user
-from bot.utils import encode, get_readable_file_size, handle_force_sub
+from bot.database import get_random_files, get_popular_files, get_recent_files, get_index_stats, increment_access_count, is_premium_user, search_files
+from bot.utils import encode, get_readable_file_size, get_readable_time, handle_force_sub, schedule_manager
+from bot.utils.delivery import SelectionStrategy, CursorStrategy, delivery_engine
+from bot.utils.message_cache import get_cached_posts
 from bot.utils.command_verification import check_command_limit, use_command
+from bot.utils.security import SecurityValidator
 # Rate limiter removed
 from info import Config
-import asyncio
+import copy
+import hashlib
+import time
 import traceback
 
+# Reply keyboard attached to every file sent by the browse modes
+BROWSE_KEYBOARD = ReplyKeyboardMarkup([
+    [
+        KeyboardButton("🎲 Random"),
+        KeyboardButton("🆕 Recent Added")
+    ],
+    [
+        KeyboardButton("💎 Buy Premium"),
+        KeyboardButton("🔥 Most Popular")
+    ]
+], resize_keyboard=True, one_time_keyboard=False)
+
 @Client.on_message(filters.command("rand") & filters.private)
 async def random_command(client: Client, message: Message):
     """Handle random command to show 5 random files"""
@@ -421,254 +438,103 @@ async def random_callback(client: Client, callback_query: CallbackQuery):
         except Exception as answer_error:
             print(f"ERROR: Could not send callback answer: {answer_error}")
 
-async def handle_random_files(client: Client, message, is_callback: bool = False, skip_command_check: bool = False):
-    """Get and display 5 random files using proper MongoDB to Telegram retrieval process"""
+class RandomStrategy(SelectionStrategy):
+    """A fresh random sample every time"""
+
+    name = "random"
+
+    async def select(self, user_id: int) -> list:
+        return await get_random_files(limit=15)  # Get more to account for invalid files
+
+# Store each user's page cursor for recent/popular files to ensure different files each time
+user_recent_cursors = {}
+user_popular_cursors = {}
+
+# Per-mode selection strategy plus the texts and buttons around it
+BROWSE_MODES = {
+    "random": {
+        "strategy": RandomStrategy(),
+        "label": "random",
+        "loading": "🎲 Getting random files...",
+        "buttons": [
+            [InlineKeyboardButton("🎲 More Random", callback_data="rand_new"), InlineKeyboardButton("🔥 Popular", callback_data="rand_popular")],
+            [InlineKeyboardButton("🆕 Recent", callback_data="rand_recent"), InlineKeyboardButton("📊 Stats", callback_data="rand_stats")],
+        ],
+    },
+    "recent": {
+        "strategy": CursorStrategy("recent", get_recent_files, "indexed_at", user_recent_cursors),
+        "label": "recent",
+        "loading": "🆕 Getting recent files...",
+        "buttons": [
+            [InlineKeyboardButton("🆕 More Recent", callback_data="rand_recent"), InlineKeyboardButton("🎲 Random", callback_data="rand_new")],
+            [InlineKeyboardButton("🔥 Popular", callback_data="rand_popular"), InlineKeyboardButton("📊 Stats", callback_data="rand_stats")],
+        ],
+    },
+    "popular": {
+        "strategy": CursorStrategy("popular", get_popular_files, "access_count", user_popular_cursors),
+        "label": "popular",
+        "loading": "🔥 Getting popular files...",
+        "buttons": [
+            [InlineKeyboardButton("🔥 More Popular", callback_data="rand_popular"), InlineKeyboardButton("🎲 Random", callback_data="rand_new")],
+            [InlineKeyboardButton("🆕 Recent", callback_data="rand_recent"), InlineKeyboardButton("📊 Stats", callback_data="rand_stats")],
+        ],
+    },
+}
+
+async def handle_browse(client: Client, message, mode: str, is_callback: bool = False):
+    """Send 5 files picked by the given browse mode, then a status message with navigation buttons"""
+    config = BROWSE_MODES[mode]
+    label = config["label"]
     loading_msg = None
 
     try:
         # Initialize loading message
         if is_callback:
-            loading_msg = await message.edit_text("🎲 Getting random files...")
+            loading_msg = await message.edit_text(config["loading"])
         else:
-            loading_msg = await message.reply_text("🎲 Getting random files...")
+            loading_msg = await message.reply_text(config["loading"])
 
-        print("DEBUG: Starting random files retrieval process...")
+        async def show_progress(report):
+            try:
+                await loading_msg.edit_text(f"📁 Processing {len(report.selected)} {label} files...")
+            except Exception as msg_error:
+                print(f"WARNING: Failed to update loading message: {msg_error}")
 
-        # Step 1: Query MongoDB for file metadata
+        # Private chats share their id with the user, which also holds for callbacks
+        # where message.from_user is the bot itself
         try:
-            results = await get_random_files(limit=15)  # Get more to account for invalid files
-            print(f"DEBUG: Retrieved {len(results)} files from database")
+            report = await delivery_engine.deliver(
+                client, message.chat.id, config["strategy"],
+                target_count=5, reply_markup=BROWSE_KEYBOARD, on_selected=show_progress
+            )
         except Exception as db_error:
-            error_msg = f"❌ Database query failed: {str(db_error)}"
             print(f"ERROR: MongoDB query failed: {db_error}")
-            await loading_msg.edit_text(error_msg)
+            await loading_msg.edit_text(f"❌ Database query failed: {str(db_error)}")
             return
 
-        if not results:
-            text = "❌ No files found in database."
-            print("DEBUG: No files found in database")
-            await loading_msg.edit_text(text)
+        if not report.selected:
+            await loading_msg.edit_text(f"❌ No {label} files found in database.")
             return
 
+        # Send final status with navigation buttons
         try:
-            await loading_msg.edit_text(f"📁 Processing {len(results)} random files...")
-        except Exception as msg_error:
-            print(f"WARNING: Failed to update loading message: {msg_error}")
-
-        # Step 2: Retrieve files from Telegram via file_id and send to user
-        sent_count = 0
-        target_count = 5  # Target number of files to send
-        errors_encountered = []
-
-        for idx, file_data in enumerate(results):
-            if sent_count >= target_count:
-                print(f"DEBUG: Reached target count of {target_count} files")
-                break
-
-            print(f"DEBUG: Processing file {idx + 1}/{len(results)}")
-
-            try:
-                # Extract metadata from MongoDB document with validation
-                if not isinstance(file_data, dict):
-                    print(f"ERROR: Invalid file_data type: {type(file_data)}")
-                    errors_encountered.append(f"Invalid data structure for file {idx + 1}")
-                    continue
-
-                file_id = str(file_data.get('_id', ''))
-                file_name = file_data.get('file_name', 'Unknown File')
-                file_type = file_data.get('file_type', 'unknown')
-                file_size = file_data.get('file_size', 0)
-
-                if not file_id:
-                    print(f"ERROR: No file_id found for file: {file_name}")
-                    errors_encountered.append(f"Missing file_id for: {file_name}")
-                    continue
-
-                print(f"DEBUG: Processing file: {file_name} with ID: {file_id}, Type: {file_type}")
-
-                # Step 3: Parse file_id to extract message_id
-                message_id = None
-                try:
-                    if '_' in file_id:
-                        # Format: "chat_id_message_id" (e.g., "-1002315371279_1767")
-                        parts = file_id.split('_')
-                        if len(parts) >= 2:
-                            message_id = int(parts[-1])  # Get the last part as message ID
-                            print(f"DEBUG: Extracted message_id {message_id} from composite ID: {file_id}")
-                        else:
-                            print(f"ERROR: Invalid composite file_id format: {file_id}")
-                            errors_encountered.append(f"Invalid ID format: {file_id}")
-                            continue
-                    else:
-                        # Format: just "message_id"
-                        message_id = int(file_id)
-                        print(f"DEBUG: Using direct message_id: {message_id}")
-
-                except (ValueError, IndexError) as parse_error:
-                    print(f"ERROR: Failed to parse message ID from {file_id}: {parse_error}")
-                    errors_encountered.append(f"Parse error for {file_id}: {str(parse_error)}")
-                    continue
-
-                if not message_id or message_id <= 0:
-                    print(f"ERROR: Invalid message_id {message_id} for file: {file_id}")
-                    errors_encountered.append(f"Invalid message_id {message_id}")
-                    continue
-
-                # Step 4: Retrieve file from Telegram using the database channel
-                try:
-                    print(f"DEBUG: Fetching message {message_id} from channel {Config.INDEX_CHANNEL_ID}")
-
-                    # Get the message from the index channel (where files are stored)
-                    db_message = await client.get_messages(Config.INDEX_CHANNEL_ID, message_id)
-
-                    if not db_message:
-                        print(f"ERROR: Message {message_id} returned None")
-                        errors_encountered.append(f"Message {message_id} not found")
-                        continue
-
-                    if db_message.empty:
-                        print(f"ERROR: Message {message_id} is empty")
-                        errors_encountered.append(f"Message {message_id} is empty")
-                        continue
-
-                    # Validate the message has media
-                    if not db_message.media:
-                        print(f"ERROR: Message {message_id} has no media")
-                        errors_encountered.append(f"Message {message_id} has no media")
-                        continue
-
-                    print(f"DEBUG: Successfully retrieved message {message_id} with media type: {type(db_message.media)}")
-
-                except Exception as telegram_get_error:
-                    print(f"ERROR: Telegram get_messages failed for message {message_id}: {telegram_get_error}")
-                    errors_encountered.append(f"Get message {message_id}: {str(telegram_get_error)}")
-                    continue
-
-                # Step 5: Send the file to user without caption/title but with custom keyboard
-                try:
-                    print(f"DEBUG: Sending media from message {message_id} to user {message.chat.id}")
-
-                    # Create custom keyboard with the requested buttons
-                    custom_keyboard = ReplyKeyboardMarkup([
-                        [
-                            KeyboardButton("🎲 Random"),
-                            KeyboardButton("🆕 Recent Added")
-                        ],
-                        [
-                            KeyboardButton("💎 Buy Premium"),
-                            KeyboardButton("🔥 Most Popular")
-                        ]
-                    ], resize_keyboard=True, one_time_keyboard=False)
-
-                    # Send media based on type without any caption but with custom keyboard
-                    copied_msg = None
-                    if db_message.photo:
-                        copied_msg = await client.send_photo(
-                            chat_id=message.chat.id,
-                            photo=db_message.photo.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.video:
-                        copied_msg = await client.send_video(
-                            chat_id=message.chat.id,
-                            video=db_message.video.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.document:
-                        copied_msg = await client.send_document(
-                            chat_id=message.chat.id,
-                            document=db_message.document.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.audio:
-                        copied_msg = await client.send_audio(
-                            chat_id=message.chat.id,
-                            audio=db_message.audio.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.voice:
-                        copied_msg = await client.send_voice(
-                            chat_id=message.chat.id,
-                            voice=db_message.voice.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.animation:
-                        copied_msg = await client.send_animation(
-                            chat_id=message.chat.id,
-                            animation=db_message.animation.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    else:
-                        # Fallback to copy method without caption but with custom keyboard
-                        copied_msg = await db_message.copy(
-                            chat_id=message.chat.id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-
-                    if copied_msg:
-                        sent_count += 1
-                        print(f"SUCCESS: Sent file #{sent_count}: {file_name}")
-
-                        # Increment access count in database
-                        try:
-                            await increment_access_count(file_id)
-                            print(f"DEBUG: Incremented access count for {file_id}")
-                        except Exception as count_error:
-                            print(f"WARNING: Failed to increment access count for {file_id}: {count_error}")
-
-                        # Small delay to avoid flooding
-                        await asyncio.sleep(1.0)
-                    else:
-                        print(f"ERROR: Send operation returned None for message {message_id}")
-                        errors_encountered.append(f"Send failed for message {message_id}")
-
-                except Exception as send_error:
-                    print(f"ERROR: Failed to send message {message_id}: {send_error}")
-                    errors_encountered.append(f"Send error for {message_id}: {str(send_error)}")
-                    continue
-
-            except Exception as processing_error:
-                print(f"ERROR: General processing error for file {idx + 1}: {processing_error}")
-                errors_encountered.append(f"Processing error: {str(processing_error)}")
-                continue
-
-        # Step 6: Send final status with navigation buttons
-        try:
-            if sent_count > 0:
-                final_text = f"✅ Successfully sent {sent_count} random files!"
-                if errors_encountered:
-                    final_text += f"\n\n⚠️ {len(errors_encountered)} files had issues (check logs)"
+            if report.sent_count > 0:
+                final_text = f"✅ Successfully sent {report.sent_count} {label} files!"
+                if report.errors:
+                    final_text += f"\n\n⚠️ {len(report.errors)} files had issues (check logs)"
             else:
-                final_text = "❌ No valid files could be sent."
-                if errors_encountered:
-                    final_text += f"\n\nErrors encountered:\n• " + "\n• ".join(errors_encountered[:3])
-                    if len(errors_encountered) > 3:
-                        final_text += f"\n• ... and {len(errors_encountered) - 3} more"
-
-            nav_buttons = [
-                InlineKeyboardButton("🎲 More Random", callback_data="rand_new"),
-                InlineKeyboardButton("🔥 Popular", callback_data="rand_popular")
-            ]
-            more_buttons = [
-                InlineKeyboardButton("🆕 Recent", callback_data="rand_recent"),
-                InlineKeyboardButton("📊 Stats", callback_data="rand_stats")
-            ]
-
-            buttons = [nav_buttons, more_buttons]
+                final_text = f"❌ No valid {label} files could be sent."
+                if report.errors:
+                    final_text += f"\n\nErrors encountered:\n• " + "\n• ".join(report.errors[:3])
+                    if len(report.errors) > 3:
+                        final_text += f"\n• ... and {len(report.errors) - 3} more"
 
             await loading_msg.edit_text(
                 final_text,
-                reply_markup=InlineKeyboardMarkup(buttons)
+                reply_markup=InlineKeyboardMarkup(config["buttons"])
             )
 
-            print(f"DEBUG: Final status - Sent: {sent_count}, Errors: {len(errors_encountered)}")
+            print(f"DEBUG: {label} files final status - Sent: {report.sent_count}, Errors: {len(report.errors)}, Took: {report.elapsed:.2f}s")
 
         except Exception as final_error:
             print(f"ERROR: Failed to send final status message: {final_error}")
@@ -678,8 +544,8 @@ async def handle_random_files(client: Client, message, is_callback: bool = False
                 pass
 
     except Exception as main_error:
-        error_text = f"❌ Critical error in random files process: {str(main_error)}"
-        print(f"CRITICAL ERROR: Main process failed: {main_error}")
+        error_text = f"❌ Critical error in {label} files process: {str(main_error)}"
+        print(f"CRITICAL ERROR: {label} files process failed: {main_error}")
 
         try:
             if loading_msg:
@@ -689,6 +555,10 @@ async def handle_random_files(client: Client, message, is_callback: bool = False
         except Exception as msg_error:
             print(f"ERROR: Could not send error message: {msg_error}")
 
+async def handle_random_files(client: Client, message, is_callback: bool = False, skip_command_check: bool = False):
+    """Get and send 5 random files directly to user"""
+    return await handle_browse(client, message, "random", is_callback)
+
 async def show_popular_files(client: Client, callback_query: CallbackQuery):
     """Show popular files"""
     try:
@@ -800,544 +670,13 @@ async def show_index_stats(client: Client, callback_query: CallbackQuery):
         print(f"Error in show_index_stats: {e}")
         await callback_query.message.edit_text(f"❌ Error: {str(e)}")
 
-# Store user offset for recent files to ensure different files each time
-user_recent_offsets = {}
-
 async def handle_recent_files_direct(client: Client, message, is_callback: bool = False):
     """Get and send 5 recent files directly to user, with different files each time"""
-    loading_msg = None
-
-    try:
-        user_id = message.from_user.id if hasattr(message, 'from_user') and message.from_user else message.chat.id
-
-        # Initialize loading message
-        if is_callback:
-            loading_msg = await message.edit_text("🆕 Getting recent files...")
-        else:
-            loading_msg = await message.reply_text("🆕 Getting recent files...")
-
-        print(f"DEBUG: Starting recent files retrieval for user {user_id}")
-
-        # Get current offset for this user (defaults to 0)
-        current_offset = user_recent_offsets.get(user_id, 0)
-        print(f"DEBUG: Current offset for user {user_id}: {current_offset}")
-
-        # Step 1: Query MongoDB for recent file metadata with offset
-        try:
-            results = await get_recent_files(limit=10, offset=current_offset)  # Get more to account for invalid files
-            print(f"DEBUG: Retrieved {len(results)} recent files from database with offset {current_offset}")
-        except Exception as db_error:
-            error_msg = f"❌ Database query failed: {str(db_error)}"
-            print(f"ERROR: MongoDB query failed: {db_error}")
-            await loading_msg.edit_text(error_msg)
-            return
-
-        if not results:
-            # Reset offset if no more files and try again
-            if current_offset > 0:
-                user_recent_offsets[user_id] = 0
-                results = await get_recent_files(limit=10, offset=0)
-                print(f"DEBUG: Reset offset, retrieved {len(results)} files")
-
-            if not results:
-                await loading_msg.edit_text("❌ No recent files found in database.")
-                return
-
-        try:
-            await loading_msg.edit_text(f"📁 Processing {len(results)} recent files...")
-        except Exception as msg_error:
-            print(f"WARNING: Failed to update loading message: {msg_error}")
-
-        # Step 2: Send 5 recent files directly to user
-        sent_count = 0
-        target_count = 5  # Target number of files to send
-        errors_encountered = []
-
-        for idx, file_data in enumerate(results):
-            if sent_count >= target_count:
-                print(f"DEBUG: Reached target count of {target_count} files")
-                break
-
-            print(f"DEBUG: Processing recent file {idx + 1}/{len(results)}")
-
-            try:
-                # Extract metadata from MongoDB document with validation
-                if not isinstance(file_data, dict):
-                    print(f"ERROR: Invalid file_data type: {type(file_data)}")
-                    errors_encountered.append(f"Invalid data structure for file {idx + 1}")
-                    continue
-
-                file_id = str(file_data.get('_id', ''))
-                file_name = file_data.get('file_name', 'Unknown File')
-                file_type = file_data.get('file_type', 'unknown')
-
-                if not file_id:
-                    print(f"ERROR: No file_id found for file: {file_name}")
-                    errors_encountered.append(f"Missing file_id for: {file_name}")
-                    continue
-
-                print(f"DEBUG: Processing recent file: {file_name} with ID: {file_id}, Type: {file_type}")
-
-                # Parse file_id to extract message_id
-                message_id = None
-                try:
-                    if '_' in file_id:
-                        parts = file_id.split('_')
-                        if len(parts) >= 2:
-                            message_id = int(parts[-1])
-                            print(f"DEBUG: Extracted message_id {message_id} from composite ID: {file_id}")
-                        else:
-                            print(f"ERROR: Invalid composite file_id format: {file_id}")
-                            errors_encountered.append(f"Invalid ID format: {file_id}")
-                            continue
-                    else:
-                        message_id = int(file_id)
-                        print(f"DEBUG: Using direct message_id: {message_id}")
-
-                except (ValueError, IndexError) as parse_error:
-                    print(f"ERROR: Failed to parse message ID from {file_id}: {parse_error}")
-                    errors_encountered.append(f"Parse error for {file_id}: {str(parse_error)}")
-                    continue
-
-                if not message_id or message_id <= 0:
-                    print(f"ERROR: Invalid message_id {message_id} for file: {file_id}")
-                    errors_encountered.append(f"Invalid message_id {message_id}")
-                    continue
-
-                # Retrieve file from Telegram
-                try:
-                    print(f"DEBUG: Fetching message {message_id} from channel {Config.INDEX_CHANNEL_ID}")
-                    db_message = await client.get_messages(Config.INDEX_CHANNEL_ID, message_id)
-
-                    if not db_message or db_message.empty or not db_message.media:
-                        print(f"ERROR: Message {message_id} invalid or has no media")
-                        errors_encountered.append(f"Message {message_id} invalid or no media")
-                        continue
-
-                    print(f"DEBUG: Successfully retrieved message {message_id} with media")
-
-                except Exception as telegram_get_error:
-                    print(f"ERROR: Telegram get_messages failed for message {message_id}: {telegram_get_error}")
-                    errors_encountered.append(f"Get message {message_id}: {str(telegram_get_error)}")
-                    continue
-
-                # Send the file to user without caption but with custom keyboard
-                try:
-                    print(f"DEBUG: Sending recent media from message {message_id} to user {message.chat.id}")
-
-                    # Create custom keyboard
-                    custom_keyboard = ReplyKeyboardMarkup([
-                        [
-                            KeyboardButton("🎲 Random"),
-                            KeyboardButton("🆕 Recent Added")
-                        ],
-                        [
-                            KeyboardButton("💎 Buy Premium"),
-                            KeyboardButton("🔥 Most Popular")
-                        ]
-                    ], resize_keyboard=True, one_time_keyboard=False)
-
-                    # Send media based on type without caption
-                    copied_msg = None
-                    if db_message.photo:
-                        copied_msg = await client.send_photo(
-                            chat_id=message.chat.id,
-                            photo=db_message.photo.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.video:
-                        copied_msg = await client.send_video(
-                            chat_id=message.chat.id,
-                            video=db_message.video.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.document:
-                        copied_msg = await client.send_document(
-                            chat_id=message.chat.id,
-                            document=db_message.document.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.audio:
-                        copied_msg = await client.send_audio(
-                            chat_id=message.chat.id,
-                            audio=db_message.audio.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.voice:
-                        copied_msg = await client.send_voice(
-                            chat_id=message.chat.id,
-                            voice=db_message.voice.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.animation:
-                        copied_msg = await client.send_animation(
-                            chat_id=message.chat.id,
-                            animation=db_message.animation.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    else:
-                        copied_msg = await db_message.copy(
-                            chat_id=message.chat.id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-
-                    if copied_msg:
-                        sent_count += 1
-                        print(f"SUCCESS: Sent recent file #{sent_count}: {file_name}")
-
-                        # Increment access count
-                        try:
-                            await increment_access_count(file_id)
-                            print(f"DEBUG: Incremented access count for {file_id}")
-                        except Exception as count_error:
-                            print(f"WARNING: Failed to increment access count for {file_id}: {count_error}")
-
-                        # Small delay to avoid flooding
-                        await asyncio.sleep(1.0)
-                    else:
-                        print(f"ERROR: Send operation returned None for message {message_id}")
-                        errors_encountered.append(f"Send failed for message {message_id}")
-
-                except Exception as send_error:
-                    print(f"ERROR: Failed to send message {message_id}: {send_error}")
-                    errors_encountered.append(f"Send error for {message_id}: {str(send_error)}")
-                    continue
-
-            except Exception as processing_error:
-                print(f"ERROR: General processing error for file {idx + 1}: {processing_error}")
-                errors_encountered.append(f"Processing error: {str(processing_error)}")
-                continue
-
-        # Update offset for next time (increment by files processed)
-        user_recent_offsets[user_id] = current_offset + len(results)
-        print(f"DEBUG: Updated offset for user {user_id} to {user_recent_offsets[user_id]}")
-
-        # Send final status with navigation buttons
-        try:
-            if sent_count > 0:
-                final_text = f"✅ Successfully sent {sent_count} recent files!"
-                if errors_encountered:
-                    final_text += f"\n\n⚠️ {len(errors_encountered)} files had issues (check logs)"
-            else:
-                final_text = "❌ No valid recent files could be sent."
-                if errors_encountered:
-                    final_text += f"\n\nErrors encountered:\n• " + "\n• ".join(errors_encountered[:3])
-                    if len(errors_encountered) > 3:
-                        final_text += f"\n• ... and {len(errors_encountered) - 3} more"
-
-            nav_buttons = [
-                InlineKeyboardButton("🆕 More Recent", callback_data="rand_recent"),
-                InlineKeyboardButton("🎲 Random", callback_data="rand_new")
-            ]
-            more_buttons = [
-                InlineKeyboardButton("🔥 Popular", callback_data="rand_popular"),
-                InlineKeyboardButton("📊 Stats", callback_data="rand_stats")
-            ]
-
-            buttons = [nav_buttons, more_buttons]
-
-            await loading_msg.edit_text(
-                final_text,
-                reply_markup=InlineKeyboardMarkup(buttons)
-            )
-
-            print(f"DEBUG: Recent files final status - Sent: {sent_count}, Errors: {len(errors_encountered)}")
-
-        except Exception as final_error:
-            print(f"ERROR: Failed to send final status message: {final_error}")
-            try:
-                await loading_msg.edit_text(f"⚠️ Process completed but status update failed: {str(final_error)}")
-            except:
-                pass
-
-    except Exception as main_error:
-        error_text = f"❌ Critical error in recent files process: {str(main_error)}"
-        print(f"CRITICAL ERROR: Recent files process failed: {main_error}")
-
-        try:
-            if loading_msg:
-                await loading_msg.edit_text(error_text)
-            else:
-                await message.reply_text(error_text)
-        except Exception as msg_error:
-            print(f"ERROR: Could not send error message: {msg_error}")
+    return await handle_browse(client, message, "recent", is_callback)
 
 async def handle_popular_files_direct(client: Client, message: Message, is_callback: bool = False):
     """Get and send 5 popular files directly to user, with different files each time"""
-    loading_msg = None
-
-    try:
-        user_id = message.from_user.id if message.from_user else message.chat.id
-
-        # Initialize loading message
-        if is_callback:
-            loading_msg = await message.edit_text("🔥 Getting popular files...")
-        else:
-            loading_msg = await message.reply_text("🔥 Getting popular files...")
-
-        print(f"DEBUG: Starting popular files retrieval for user {user_id}")
-
-        # Get current offset for this user (defaults to 0)
-        current_offset = user_popular_offsets.get(user_id, 0)
-        print(f"DEBUG: Current offset for user {user_id}: {current_offset}")
-
-        # Step 1: Query MongoDB for popular file metadata with offset
-        try:
-            results = await get_popular_files(limit=10, offset=current_offset)  # Get more to account for invalid files
-            print(f"DEBUG: Retrieved {len(results)} popular files from database with offset {current_offset}")
-        except Exception as db_error:
-            error_msg = f"❌ Database query failed: {str(db_error)}"
-            print(f"ERROR: MongoDB query failed: {db_error}")
-            await loading_msg.edit_text(error_msg)
-            return
-
-        if not results:
-            # Reset offset if no more files and try again
-            if current_offset > 0:
-                user_popular_offsets[user_id] = 0
-                results = await get_popular_files(limit=10, offset=0)
-                print(f"DEBUG: Reset offset, retrieved {len(results)} files")
-
-            if not results:
-                await loading_msg.edit_text("❌ No popular files found in database.")
-                return
-
-        try:
-            await loading_msg.edit_text(f"📁 Processing {len(results)} popular files...")
-        except Exception as msg_error:
-            print(f"WARNING: Failed to update loading message: {msg_error}")
-
-        # Step 2: Send 5 popular files directly to user
-        sent_count = 0
-        target_count = 5  # Target number of files to send
-        errors_encountered = []
-
-        for idx, file_data in enumerate(results):
-            if sent_count >= target_count:
-                print(f"DEBUG: Reached target count of {target_count} files")
-                break
-
-            print(f"DEBUG: Processing popular file {idx + 1}/{len(results)}")
-
-            try:
-                # Extract metadata from MongoDB document with validation
-                if not isinstance(file_data, dict):
-                    print(f"ERROR: Invalid file_data type: {type(file_data)}")
-                    errors_encountered.append(f"Invalid data structure for file {idx + 1}")
-                    continue
-
-                file_id = str(file_data.get('_id', ''))
-                file_name = file_data.get('file_name', 'Unknown File')
-                file_type = file_data.get('file_type', 'unknown')
-                access_count = file_data.get('access_count', 0)
-
-                if not file_id:
-                    print(f"ERROR: No file_id found for file: {file_name}")
-                    errors_encountered.append(f"Missing file_id for: {file_name}")
-                    continue
-
-                print(f"DEBUG: Processing popular file: {file_name} with ID: {file_id}, Type: {file_type}, Views: {access_count}")
-
-                # Parse file_id to extract message_id
-                message_id = None
-                try:
-                    if '_' in file_id:
-                        parts = file_id.split('_')
-                        if len(parts) >= 2:
-                            message_id = int(parts[-1])
-                            print(f"DEBUG: Extracted message_id {message_id} from composite ID: {file_id}")
-                        else:
-                            print(f"ERROR: Invalid composite file_id format: {file_id}")
-                            errors_encountered.append(f"Invalid ID format: {file_id}")
-                            continue
-                    else:
-                        message_id = int(file_id)
-                        print(f"DEBUG: Using direct message_id: {message_id}")
-
-                except (ValueError, IndexError) as parse_error:
-                    print(f"ERROR: Failed to parse message ID from {file_id}: {parse_error}")
-                    errors_encountered.append(f"Parse error for {file_id}: {str(parse_error)}")
-                    continue
-
-                if not message_id or message_id <= 0:
-                    print(f"ERROR: Invalid message_id {message_id} for file: {file_id}")
-                    errors_encountered.append(f"Invalid message_id {message_id}")
-                    continue
-
-                # Retrieve file from Telegram
-                try:
-                    print(f"DEBUG: Fetching message {message_id} from channel {Config.INDEX_CHANNEL_ID}")
-                    db_message = await client.get_messages(Config.INDEX_CHANNEL_ID, message_id)
-
-                    if not db_message or db_message.empty or not db_message.media:
-                        print(f"ERROR: Message {message_id} invalid or has no media")
-                        errors_encountered.append(f"Message {message_id} invalid or no media")
-                        continue
-
-                    print(f"DEBUG: Successfully retrieved message {message_id} with media")
-
-                except Exception as telegram_get_error:
-                    print(f"ERROR: Telegram get_messages failed for message {message_id}: {telegram_get_error}")
-                    errors_encountered.append(f"Get message {message_id}: {str(telegram_get_error)}")
-                    continue
-
-                # Send the file to user without caption but with custom keyboard
-                try:
-                    print(f"DEBUG: Sending popular media from message {message_id} to user {message.chat.id}")
-
-                    # Create custom keyboard
-                    custom_keyboard = ReplyKeyboardMarkup([
-                        [
-                            KeyboardButton("🎲 Random"),
-                            KeyboardButton("🆕 Recent Added")
-                        ],
-                        [
-                            KeyboardButton("💎 Buy Premium"),
-                            KeyboardButton("🔥 Most Popular")
-                        ]
-                    ], resize_keyboard=True, one_time_keyboard=False)
-
-                    # Send media based on type without caption
-                    copied_msg = None
-                    if db_message.photo:
-                        copied_msg = await client.send_photo(
-                            chat_id=message.chat.id,
-                            photo=db_message.photo.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.video:
-                        copied_msg = await client.send_video(
-                            chat_id=message.chat.id,
-                            video=db_message.video.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.document:
-                        copied_msg = await client.send_document(
-                            chat_id=message.chat.id,
-                            document=db_message.document.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.audio:
-                        copied_msg = await client.send_audio(
-                            chat_id=message.chat.id,
-                            audio=db_message.audio.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.voice:
-                        copied_msg = await client.send_voice(
-                            chat_id=message.chat.id,
-                            voice=db_message.voice.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    elif db_message.animation:
-                        copied_msg = await client.send_animation(
-                            chat_id=message.chat.id,
-                            animation=db_message.animation.file_id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-                    else:
-                        copied_msg = await db_message.copy(
-                            chat_id=message.chat.id,
-                            reply_markup=custom_keyboard,
-                            protect_content=Config.PROTECT_CONTENT
-                        )
-
-                    if copied_msg:
-                        sent_count += 1
-                        print(f"SUCCESS: Sent popular file #{sent_count}: {file_name}")
-
-                        # Increment access count
-                        try:
-                            await increment_access_count(file_id)
-                            print(f"DEBUG: Incremented access count for {file_id}")
-                        except Exception as count_error:
-                            print(f"WARNING: Failed to increment access count for {file_id}: {count_error}")
-
-                        # Small delay to avoid flooding
-                        await asyncio.sleep(1.0)
-                    else:
-                        print(f"ERROR: Send operation returned None for message {message_id}")
-                        errors_encountered.append(f"Send failed for message {message_id}")
-
-                except Exception as send_error:
-                    print(f"ERROR: Failed to send message {message_id}: {send_error}")
-                    errors_encountered.append(f"Send error for {message_id}: {str(send_error)}")
-                    continue
-
-            except Exception as processing_error:
-                print(f"ERROR: General processing error for file {idx + 1}: {processing_error}")
-                errors_encountered.append(f"Processing error: {str(processing_error)}")
-                continue
-
-        # Update offset for next time (increment by files processed)
-        user_popular_offsets[user_id] = current_offset + len(results)
-        print(f"DEBUG: Updated offset for user {user_id} to {user_popular_offsets[user_id]}")
-
-        # Send final status with navigation buttons
-        try:
-            if sent_count > 0:
-                final_text = f"✅ Successfully sent {sent_count} popular files!"
-                if errors_encountered:
-                    final_text += f"\n\n⚠️ {len(errors_encountered)} files had issues (check logs)"
-            else:
-                final_text = "❌ No valid popular files could be sent."
-                if errors_encountered:
-                    final_text += f"\n\nErrors encountered:\n• " + "\n• ".join(errors_encountered[:3])
-                    if len(errors_encountered) > 3:
-                        final_text += f"\n• ... and {len(errors_encountered) - 3} more"
-
-            nav_buttons = [
-                InlineKeyboardButton("🔥 More Popular", callback_data="rand_popular"),
-                InlineKeyboardButton("🎲 Random", callback_data="rand_new")
-            ]
-            more_buttons = [
-                InlineKeyboardButton("🆕 Recent", callback_data="rand_recent"),
-                InlineKeyboardButton("📊 Stats", callback_data="rand_stats")
-            ]
-
-            buttons = [nav_buttons, more_buttons]
-
-            await loading_msg.edit_text(
-                final_text,
-                reply_markup=InlineKeyboardMarkup(buttons)
-            )
-
-            print(f"DEBUG: Popular files final status - Sent: {sent_count}, Errors: {len(errors_encountered)}")
-
-        except Exception as final_error:
-            print(f"ERROR: Failed to send final status message: {final_error}")
-            try:
-                await loading_msg.edit_text(f"⚠️ Process completed but status update failed: {str(final_error)}")
-            except:
-                pass
-
-    except Exception as main_error:
-        error_text = f"❌ Critical error in popular files process: {str(main_error)}"
-        print(f"CRITICAL ERROR: Popular files process failed: {main_error}")
-
-        try:
-            if loading_msg:
-                await loading_msg.edit_text(error_text)
-            else:
-                await message.reply_text(error_text)
-        except Exception as msg_error:
-            print(f"ERROR: Could not send error message: {msg_error}")
-
-# Store user offset for popular files to ensure different files each time
-user_popular_offsets = {}
+    return await handle_browse(client, message, "popular", is_callback)
 
 # Aliases for backward compatibility with callback.py imports
 async def handle_recent_files(client: Client, message: Message, is_callback: bool = False, skip_command_check: bool = False):
@@ -1437,4 +776,252 @@ async def recent_files_command(client: Client, message: Message):
         await handle_recent_files_direct(client, message, is_callback=False)
     except Exception as e:
         print(f"Error in recent_files_command: {e}")
-        await message.reply_text(f"❌ Error: {str(e)}")
\ No newline at end of file
+        await message.reply_text(f"❌ Error: {str(e)}")
+
+# ──────────────────────────────────────────────────────────────
+# /search - paginated full-text search over the file index
+
+SEARCH_PAGE_SIZE = 10
+SEARCH_RESULT_LIMIT = 50
+SEARCH_CACHE_TTL = 300  # Seconds a result list stays valid for page flips
+SEARCH_CACHE_MAX_ENTRIES = 500
+
+# Cached result lists keyed by a short query hash: {key: {"user_id", "query", "results", "expires_at"}}
+search_cache = {}
+
+def _search_cache_key(user_id: int, query: str) -> str:
+    """Short, callback-safe cache key for a user's query"""
+    normalized = " ".join(query.lower().split())
+    return hashlib.sha1(f"{user_id}:{normalized}".encode("utf-8")).hexdigest()[:12]
+
+def _get_cached_search(key: str):
+    """Return a live cache entry or None, dropping it if expired"""
+    entry = search_cache.get(key)
+    if not entry:
+        return None
+    if entry["expires_at"] < time.monotonic():
+        search_cache.pop(key, None)
+        return None
+    return entry
+
+def _store_search(key: str, user_id: int, query: str, results: list):
+    """Cache only the fields needed to render pages and deliver files"""
+    now = time.monotonic()
+
+    # Drop expired entries, then the oldest ones if we are still over capacity
+    for stale_key in [k for k, v in search_cache.items() if v["expires_at"] < now]:
+        search_cache.pop(stale_key, None)
+    while len(search_cache) >= SEARCH_CACHE_MAX_ENTRIES:
+        search_cache.pop(next(iter(search_cache)))
+
+    search_cache[key] = {
+        "user_id": user_id,
+        "query": query,
+        "results": [
+            {
+                "_id": str(doc.get("_id", "")),
+                "file_name": doc.get("file_name", "Unknown"),
+                "file_type": doc.get("file_type", "unknown"),
+                "file_size": doc.get("file_size", 0),
+            }
+            for doc in results if doc.get("_id")
+        ],
+        "expires_at": now + SEARCH_CACHE_TTL,
+    }
+    return search_cache[key]
+
+def _render_search_page(key: str, entry: dict, page: int):
+    """Build the text and keyboard for one page of cached results"""
+    results = entry["results"]
+    total_pages = max(1, (len(results) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE)
+    page = min(max(page, 0), total_pages - 1)
+    start = page * SEARCH_PAGE_SIZE
+
+    text = f"🔍 **Results for:** `{entry['query']}`\n"
+    text += f"📁 **Found:** {len(results)} files • Page {page + 1}/{total_pages}\n\n"
+    text += "Tap a file to receive it."
+
+    buttons = []
+    for idx, file_data in enumerate(results[start:start + SEARCH_PAGE_SIZE], start):
+        file_name = file_data["file_name"]
+        display_name = file_name[:35] + "..." if len(file_name) > 35 else file_name
+        size = get_readable_file_size(file_data["file_size"] or 0)
+        buttons.append([InlineKeyboardButton(
+            f"{file_data['file_type'].upper()} • {display_name} ({size})",
+            callback_data=f"sget#{key}#{idx}"
+        )])
+
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"srch#{key}#{page - 1}"))
+    if page < total_pages - 1:
+        nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"srch#{key}#{page + 1}"))
+    if nav_buttons:
+        buttons.append(nav_buttons)
+    buttons.append([InlineKeyboardButton("🔒 Close", callback_data="close")])
+
+    return text, InlineKeyboardMarkup(buttons)
+
+@Client.on_message(filters.command("search") & filters.private)
+async def search_command(client: Client, message: Message):
+    """Search indexed files by name: /search <query>"""
+    try:
+        # Check force subscription first
+        if await handle_force_sub(client, message):
+            return
+
+        if len(message.command) < 2:
+            return await message.reply_text("❌ Usage: `/search <query>`\nExample: `/search avatar 2009`")
+
+        user_id = message.from_user.id
+        query = message.text.split(None, 1)[1].strip()
+
+        # Validate before charging a command for it
+        try:
+            SecurityValidator.sanitize_search_query(query)
+        except ValueError as e:
+            return await message.reply_text(f"❌ Invalid search query: {e}")
+
+        key = _search_cache_key(user_id, query)
+        entry = _get_cached_search(key)
+
+        if entry is None:
+            # Check command limit and use command if allowed
+            if not await use_command(user_id):
+                buttons = InlineKeyboardMarkup([
+                    [InlineKeyboardButton("🔐 Get Access Token", callback_data="get_token")],
+                    [InlineKeyboardButton("💎 Remove Ads - Buy Premium", callback_data="show_premium_plans")],
+                    [InlineKeyboardButton("🔄 Send /start", url=f"https://t.me/{client.username}?start=")]
+                ])
+                await message.reply_text(
+                    f"⚠️ **Command Limit Reached!**\n\n"
+                    f"You've used all your free commands (3/3).\n\n"
+                    f"🔓 **Get instant access by:**\n"
+                    f"• Getting a verification token (with ads)\n"
+                    f"• Upgrading to Premium (no ads)\n\n"
+                    f"💡 Premium users get unlimited access without verification!",
+                    reply_markup=buttons
+                )
+                return
+
+            results = await search_files(query, limit=SEARCH_RESULT_LIMIT)
+            print(f"DEBUG: /search '{query}' returned {len(results)} results for user {user_id}")
+            entry = _store_search(key, user_id, query, results)
+        else:
+            print(f"DEBUG: /search '{query}' served from cache for user {user_id}")
+
+        if not entry["results"]:
+            search_cache.pop(key, None)
+            return await message.reply_text(f"❌ No files found for `{query}`.")
+
+        text, markup = _render_search_page(key, entry, 0)
+        await message.reply_text(text, reply_markup=markup)
+
+    except Exception as e:
+        print(f"Error in search_command: {e}")
+        await message.reply_text(f"❌ Error: {str(e)}")
+
+@Client.on_callback_query(filters.regex(r"^srch#"))
+async def search_page_callback(client: Client, callback_query: CallbackQuery):
+    """Flip between pages of a cached search result"""
+    try:
+        _, key, page = callback_query.data.split("#")
+        entry = _get_cached_search(key)
+
+        if not entry or entry["user_id"] != callback_query.from_user.id:
+            return await callback_query.answer("⌛ This search has expired. Please search again.", show_alert=True)
+
+        text, markup = _render_search_page(key, entry, int(page))
+        await callback_query.message.edit_text(text, reply_markup=markup)
+        await callback_query.answer()
+
+    except Exception as e:
+        print(f"Error in search_page_callback: {e}")
+        await callback_query.answer("❌ Error loading page. Please try again.", show_alert=True)
+
+@Client.on_callback_query(filters.regex(r"^sget#"))
+async def search_file_callback(client: Client, callback_query: CallbackQuery):
+    """Send a file picked from a cached search result"""
+    try:
+        _, key, idx = callback_query.data.split("#")
+        entry = _get_cached_search(key)
+
+        if not entry or entry["user_id"] != callback_query.from_user.id:
+            return await callback_query.answer("⌛ This search has expired. Please search again.", show_alert=True)
+
+        idx = int(idx)
+        if not 0 <= idx < len(entry["results"]):
+            return await callback_query.answer("❌ File not found in this search.", show_alert=True)
+        file_id = entry["results"][idx]["_id"]
+
+        # Format: "chat_message_id", the chat being the channel the file was indexed from
+        chat_part, _, message_part = file_id.rpartition("_")
+        message_id = int(message_part)
+        try:
+            chat_id = int(chat_part) if chat_part else Config.INDEX_CHANNEL_ID
+        except ValueError:
+            chat_id = chat_part
+
+        # Same gates as every other delivery: force sub, then the user's quota.
+        # handle_force_sub reads the user from the message, which here is the bot's
+        gate_message = copy.copy(callback_query.message)
+        gate_message.from_user = callback_query.from_user
+        if await handle_force_sub(client, gate_message):
+            return await callback_query.answer()
+
+        user_id = callback_query.from_user.id
+        if not await use_command(user_id):
+            buttons = InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔐 Get Access Token", callback_data="get_token")],
+                [InlineKeyboardButton("💎 Remove Ads - Buy Premium", callback_data="show_premium_plans")],
+                [InlineKeyboardButton("🔄 Send /start", url=f"https://t.me/{client.username}?start=")]
+            ])
+            await callback_query.message.reply_text(
+                f"⚠️ **Command Limit Reached!**\n\n"
+                f"You've used all your free commands (3/3).\n\n"
+                f"🔓 **Get instant access by:**\n"
+                f"• Getting a verification token (with ads)\n"
+                f"• Upgrading to Premium (no ads)\n\n"
+                f"💡 Premium users get unlimited access without verification!",
+                reply_markup=buttons
+            )
+            return await callback_query.answer()
+
+        post = (await get_cached_posts(client, chat_id, [message_id])).get(message_id)
+        if not post or not post.media:
+            return await callback_query.answer("❌ This file is no longer available.", show_alert=True)
+
+        sent = await post.send(
+            client,
+            chat_id=callback_query.message.chat.id,
+            protect_content=Config.PROTECT_CONTENT
+        )
+        await callback_query.answer()
+
+        if Config.AUTO_DELETE_TIME and sent:
+            files_to_delete = [sent.id]
+            warning = await client.send_message(
+                callback_query.message.chat.id,
+                Config.AUTO_DELETE_MSG.format(time=get_readable_time(Config.AUTO_DELETE_TIME))
+            )
+            if warning:
+                files_to_delete.append(warning.id)
+
+            # Deep links only address DB channel posts; other files are retrieved by searching again
+            base64_file_link = encode(f"get-{message_id * abs(client.db_channel.id)}") if chat_id == client.db_channel.id else ""
+            await schedule_manager.schedule_delete(
+                client=client,
+                chat_id=callback_query.message.chat.id,
+                message_ids=files_to_delete,
+                delete_n_seconds=Config.AUTO_DELETE_TIME,
+                base64_file_link=base64_file_link,
+            )
+
+        try:
+            await increment_access_count(file_id)
+        except Exception as count_error:
+            print(f"WARNING: Failed to increment access count for {file_id}: {count_error}")
+
+    except Exception as e:
+        print(f"Error in search_file_callback: {e}")
+        await callback_query.answer("❌ Could not send this file. Please try again.", show_alert=True)
@@ -2,13 +2,13 @@
 
 import asyncio
 from pyrogram import Client, filters
-from pyrogram.enums import ParseMode
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from pyrogram.errors import FloodWait
 
 from info import Config
 from bot.utils import handle_force_sub, decode, get_messages, get_readable_time, schedule_manager
-from bot.database import add_user, present_user, is_verified, validate_token_and_verify, is_premium_user, increment_access_count
+from bot.database import add_user, present_user, validate_token_and_verify, increment_access_count
+from bot.database.entitlements import get_entitlement
 
 # ──────────────────────────────────────────────────────────────
 
@@ -81,7 +81,8 @@ async def start_handler(client: Client, message: Message):
         # ✅ Check verification only if required (skip for premium users)
         if Config.VERIFY_MODE and (user_id not in Config.ADMINS and user_id != Config.OWNER_ID):
             # Skip verification for premium users
-            if not await is_premium_user(user_id) and not await is_verified(user_id):
+            entitlement = await get_entitlement(user_id)
+            if not entitlement.is_premium and not entitlement.is_verified:
                 buttons = [
                     [InlineKeyboardButton("🔐 Get Access Token", url=f"https://t.me/{client.username}?start=")],
                     [InlineKeyboardButton("💎 Remove Ads - Buy Premium", callback_data="show_premium_plans")]
@@ -104,21 +105,22 @@ async def start_handler(client: Client, message: Message):
         to_delete = []
         for msg in messages:
             caption = ""
-            if Config.CUSTOM_CAPTION and msg.document:
+            if Config.CUSTOM_CAPTION and msg.media_type == "document":
                 caption = Config.CUSTOM_CAPTION.format(
-                    previouscaption=msg.caption.html if msg.caption else "",
-                    filename=msg.document.file_name
+                    previouscaption=msg.caption,
+                    filename=msg.file_name
                 )
             else:
-                caption = msg.caption.html if msg.caption else ""
+                caption = msg.caption
 
             markup = msg.reply_markup if Config.DISABLE_CHANNEL_BUTTON else None
 
             try:
-                sent = await msg.copy(
+                # Posts come from the message cache, so repeat requests skip get_messages
+                sent = await msg.send(
+                    client,
                     chat_id=user_id,
                     caption=caption,
-                    parse_mode=ParseMode.HTML,
                     reply_markup=markup,
                     protect_content=Config.PROTECT_CONTENT
                 )
@@ -158,9 +160,9 @@ async def start_handler(client: Client, message: Message):
             ]
         ])
         # Check remaining commands and premium status
-        from bot.utils.command_verification import check_command_limit
-        needs_verification, remaining = await check_command_limit(user_id)
-        is_premium = await is_premium_user(user_id)
+        entitlement = await get_entitlement(user_id)
+        needs_verification, remaining = entitlement.command_status()
+        is_premium = entitlement.is_premium
 
         command_status = ""
         if user_id in Config.ADMINS or user_id == Config.OWNER_ID:
@@ -179,7 +181,8 @@ async def start_handler(client: Client, message: Message):
         caption = Config.START_MSG + f"""
 
 ✨ **Available Command:**
-🎲 `/rand` - Get 5 random media files instantly!{command_status}"""
+🎲 `/rand` - Get 5 random media files instantly!
+🔍 `/search <name>` - Search files by name{command_status}"""
 
         caption = caption.format(
             first=message.from_user.first_name,
@@ -196,7 +199,7 @@ async def start_handler(client: Client, message: Message):
 
 # ──────────────────────────────────────────────────────────────
 
-@Client.on_message(filters.private & filters.text & ~filters.command(['start', 'token', 'rand']) & ~filters.regex(r"^(🎲 Random Files|💎 Premium Plans)$"))
+@Client.on_message(filters.private & filters.text & ~filters.command(['start', 'token', 'rand', 'search']) & ~filters.regex(r"^(🎲 Random Files|💎 Premium Plans)$"))
 async def handle_useless_messages(client: Client, message: Message):
     """Handle any useless/random text messages with comprehensive error handling"""
     try:
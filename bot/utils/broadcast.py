@@ -0,0 +1,191 @@
+import asyncio
+import time
+from pyrogram.errors import FloodWait, UserIsBlocked, InputUserDeactivated, MessageNotModified
+from info import Config
+
+BROADCAST_CHUNK = 500       # Users loaded, sent and checkpointed per step
+PROGRESS_INTERVAL = 5       # Seconds between progress edits
+MAX_FLOOD_RETRIES = 3       # FloodWait retries per user before counting a failure
+
+
+class TokenBucket:
+    """Global messages-per-second limiter shared by all senders of one broadcast"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for seconds, e.g. after a FloodWait"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+def _render(counts: dict, total_users: int, done: bool) -> str:
+    header = "<b><u>📢 Broadcast Summary</u></b>" if done else "<b>📢 Broadcasting...</b>"
+    return f"""{header}
+
+👥 Total Users: <code>{counts['total']}</code>{'' if done else f' / <code>{total_users}</code>'}
+✅ Sent: <code>{counts['sent']}</code>
+⛔ Blocked: <code>{counts['blocked']}</code>
+❌ Deleted: <code>{counts['deleted']}</code>
+⚠️ Failed: <code>{counts['failed']}</code>
+🧹 Pruned: <code>{counts['pruned']}</code>"""
+
+
+class BroadcastEngine:
+    """
+    Sends one message to every user with N concurrent senders behind a shared
+    token bucket. Progress is checkpointed in MongoDB after every chunk of
+    users, so a broadcast interrupted by a restart resumes where it stopped
+    (at most one chunk is sent twice).
+    """
+
+    def __init__(self, rate: float = Config.BROADCAST_RATE, workers: int = Config.BROADCAST_WORKERS,
+                 chunk_size: int = BROADCAST_CHUNK, progress_interval: int = PROGRESS_INTERVAL):
+        self.rate = rate
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.progress_interval = progress_interval
+        self.active = {}
+
+    async def start(self, client, message, source: dict):
+        """Start a broadcast requested by message; source as in broadcast_db.create_broadcast"""
+        from bot.database.broadcast_db import create_broadcast
+
+        status = await message.reply("<i>Broadcasting message. Please wait...</i>")
+        job = await create_broadcast(source, status.chat.id, status.id)
+        self._spawn(client, job)
+        return job
+
+    async def resume(self, client):
+        """Restart jobs that were still running when the bot stopped"""
+        from bot.database.broadcast_db import get_running_broadcasts
+
+        for job in await get_running_broadcasts():
+            if job["_id"] not in self.active:
+                print(f"DEBUG: Resuming broadcast {job['_id']} after user {job['last_user_id']}")
+                self._spawn(client, job)
+
+    def _spawn(self, client, job: dict):
+        task = asyncio.create_task(self.run(client, job))
+        self.active[job["_id"]] = task
+        task.add_done_callback(lambda _: self.active.pop(job["_id"], None))
+
+    async def _send(self, client, source: dict, user_id: int):
+        if source["type"] == "copy":
+            return await client.copy_message(user_id, source["chat_id"], source["message_id"])
+        return await client.send_message(user_id, source["text"])
+
+    async def _deliver(self, client, bucket: TokenBucket, source: dict, user_id: int) -> str:
+        """Send to one user and return the counter to bump"""
+        for _ in range(MAX_FLOOD_RETRIES + 1):
+            await bucket.acquire()
+            try:
+                await self._send(client, source, user_id)
+                return "sent"
+            except FloodWait as e:
+                # Flood limits apply to the whole bot, so every sender backs off
+                print(f"WARNING: Broadcast FloodWait {e.value}s")
+                bucket.pause(e.value)
+            except UserIsBlocked:
+                return "blocked"
+            except InputUserDeactivated:
+                return "deleted"
+            except Exception:
+                return "failed"
+        return "failed"
+
+    async def _edit_status(self, client, job: dict, text: str):
+        try:
+            await client.edit_message_text(job["admin_chat_id"], job["status_message_id"], text)
+        except MessageNotModified:
+            pass
+        except Exception as e:
+            print(f"WARNING: Could not update broadcast status: {e}")
+
+    async def _report_progress(self, client, job: dict, counts: dict, total_users: int):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._edit_status(client, job, _render(counts, total_users, done=False))
+
+    async def run(self, client, job: dict):
+        from bot.database import get_users_count, get_user_ids_after, del_users
+        from bot.database.broadcast_db import save_broadcast_progress, finish_broadcast
+
+        bucket = TokenBucket(self.rate)
+        counts = dict(job["counts"])
+        counts.setdefault("pruned", 0)
+        last_user_id = job["last_user_id"]
+        total_users = await get_users_count()
+        reporter = asyncio.create_task(self._report_progress(client, job, counts, total_users))
+
+        try:
+            while True:
+                user_ids = await get_user_ids_after(last_user_id, self.chunk_size)
+                if not user_ids:
+                    break
+
+                dead_users = []
+                queue = asyncio.Queue()
+                for user_id in user_ids:
+                    queue.put_nowait(user_id)
+
+                async def sender():
+                    while not queue.empty():
+                        user_id = queue.get_nowait()
+                        outcome = await self._deliver(client, bucket, job["source"], user_id)
+                        counts[outcome] += 1
+                        counts["total"] += 1
+                        if outcome in ("blocked", "deleted"):
+                            dead_users.append(user_id)
+
+                await asyncio.gather(*(sender() for _ in range(min(self.workers, len(user_ids)))))
+
+                # Remove blocked/deactivated users of this chunk in one delete_many
+                # before checkpointing, so a resume never skips a pending prune
+                if dead_users:
+                    try:
+                        counts["pruned"] += await del_users(dead_users)
+                    except Exception as e:
+                        print(f"WARNING: Could not prune {len(dead_users)} users: {e}")
+
+                last_user_id = user_ids[-1]
+                await save_broadcast_progress(job["_id"], last_user_id, counts)
+
+            await finish_broadcast(job["_id"], counts)
+            print(f"DEBUG: Broadcast {job['_id']} finished: {counts}")
+        except asyncio.CancelledError:
+            # Left as running so the next start resumes it
+            raise
+        except Exception as e:
+            print(f"ERROR: Broadcast {job['_id']} failed: {e}")
+            await finish_broadcast(job["_id"], counts, state="failed")
+        finally:
+            reporter.cancel()
+
+        await self._edit_status(client, job, _render(counts, total_users, done=True))
+
+
+# Shared engine used by both broadcast commands
+broadcast_engine = BroadcastEngine()
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from info import Config
+
+CHANNEL_REFRESH_INTERVAL = 30 * 60   # Seconds between background metadata refreshes
+
+# Join-request links are shared from a small pool per request channel and
+# replaced once they are old or have been handed out many times. Telegram
+# expires them on its own a day after rotation, so nothing has to be revoked.
+JOIN_LINK_POOL_SIZE = 3
+JOIN_LINK_MAX_AGE = 24 * 60 * 60
+JOIN_LINK_MAX_USES = 1000
+JOIN_LINK_GRACE = 24 * 60 * 60
+JOIN_LINK_RETRY_AFTER = 5 * 60      # Back-off after creating links failed
+
+
+def fallback_link(channel_id: int) -> str:
+    return f"https://t.me/c/{str(channel_id)[4:]}"
+
+
+class ChannelStore:
+    """
+    Title and invite link of every force-sub and request channel, kept in memory
+    so the force-sub screen and admin listings never call get_chat.
+    """
+
+    def __init__(self):
+        # {channel_id: {"title": str, "invite_link": str or None}}
+        self.channels = {}
+        # {channel_id: [{"link": str, "created": float, "served": int}, ...]}
+        self.join_links = {}
+        self._rotating = set()
+        self._retry_at = {}
+        # Bumped on every change so rendered force-sub templates know to rebuild
+        self.version = 0
+
+    def get(self, channel_id: int) -> dict:
+        return self.channels.get(channel_id) or {"title": f"Channel {channel_id}", "invite_link": None}
+
+    def title(self, channel_id: int) -> str:
+        return self.get(channel_id)["title"]
+
+    def invite_link(self, channel_id: int) -> str:
+        return self.get(channel_id)["invite_link"] or fallback_link(channel_id)
+
+    async def load(self, client, channel_id: int, chat=None, export_link: bool = True) -> dict:
+        """Fetch (or take the given chat's) title and invite link for one channel and store them"""
+        chat = chat or await client.get_chat(channel_id)
+        # Reuse a link we already exported: exporting again would revoke it
+        link = chat.invite_link or self.channels.get(channel_id, {}).get("invite_link")
+        # Request channels are joined through join-request links, not the primary link
+        if not link and export_link:
+            try:
+                link = await client.export_chat_invite_link(channel_id)
+            except Exception as e:
+                print(f"DEBUG: Could not export invite link for {channel_id}: {e}")
+
+        info = {"title": chat.title or f"Channel {channel_id}", "invite_link": link}
+        if self.channels.get(channel_id) != info:
+            self.channels[channel_id] = info
+            self.version += 1
+        return info
+
+    def remove(self, channel_id: int):
+        self.channels.pop(channel_id, None)
+        self.join_links.pop(channel_id, None)
+        self.version += 1
+
+    def _is_stale(self, entry: dict) -> bool:
+        return entry["served"] >= JOIN_LINK_MAX_USES or time.monotonic() - entry["created"] >= JOIN_LINK_MAX_AGE
+
+    def _maybe_rotate(self, client, channel_id: int, pool: list):
+        if (len(pool) < JOIN_LINK_POOL_SIZE and channel_id not in self._rotating
+                and self._retry_at.get(channel_id, 0) <= time.monotonic()):
+            asyncio.create_task(self.rotate_join_links(client, channel_id))
+
+    def join_request_link(self, client, channel_id: int):
+        """
+        A pooled join-request link for channel_id, or None if the pool is still empty.
+        Never calls Telegram; a stale pool is rotated in the background. Callers
+        report each hand-out with note_served.
+        """
+        pool = [entry for entry in self.join_links.get(channel_id, []) if not self._is_stale(entry)]
+        self._maybe_rotate(client, channel_id, pool)
+        if not pool:
+            return None
+
+        # Spread users over the pool so links age at the same pace
+        return min(pool, key=lambda e: e["served"])["link"]
+
+    def note_served(self, client, channel_id: int, link: str):
+        """Count one hand-out of a pooled link, rotating the pool once links go stale"""
+        pool = self.join_links.get(channel_id, [])
+        for entry in pool:
+            if entry["link"] == link:
+                entry["served"] += 1
+        self._maybe_rotate(client, channel_id, [entry for entry in pool if not self._is_stale(entry)])
+
+    async def rotate_join_links(self, client, channel_id: int):
+        """Drop stale join-request links and create new ones up to JOIN_LINK_POOL_SIZE"""
+        if channel_id in self._rotating:
+            return
+        self._rotating.add(channel_id)
+        try:
+            pool = [entry for entry in self.join_links.get(channel_id, []) if not self._is_stale(entry)]
+            self.join_links[channel_id] = pool
+            while len(pool) < JOIN_LINK_POOL_SIZE:
+                invite = await client.create_chat_invite_link(
+                    channel_id,
+                    name=f"Join Requests {datetime.utcnow():%m-%d %H:%M}",
+                    expire_date=datetime.utcnow() + timedelta(seconds=JOIN_LINK_MAX_AGE + JOIN_LINK_GRACE),
+                    creates_join_request=True
+                )
+                pool.append({"link": invite.invite_link, "created": time.monotonic(), "served": 0})
+                self.join_links[channel_id] = pool
+                self.version += 1
+        except Exception as e:
+            # Usually missing invite rights; don't retry on every force-sub screen
+            self._retry_at[channel_id] = time.monotonic() + JOIN_LINK_RETRY_AFTER
+            print(f"DEBUG: Failed to create join request links for {channel_id}: {e}")
+        finally:
+            self._rotating.discard(channel_id)
+
+    async def warm(self, client):
+        """Load every configured channel concurrently; failures keep any previous entry"""
+        channel_ids = list(dict.fromkeys(Config.FORCE_SUB_CHANNEL + getattr(Config, 'REQUEST_CHANNEL', [])))
+        results = await asyncio.gather(
+            *(self.load(client, ch, export_link=ch in Config.FORCE_SUB_CHANNEL) for ch in channel_ids),
+            return_exceptions=True
+        )
+        for channel_id, result in zip(channel_ids, results):
+            if isinstance(result, Exception):
+                print(f"❌ Error loading channel {channel_id}: {result}")
+            else:
+                print(f"✅ Loaded channel info: {result['title']} - {result['invite_link']}")
+
+        if Config.JOIN_REQUEST_ENABLE:
+            await asyncio.gather(*(self.rotate_join_links(client, ch) for ch in getattr(Config, 'REQUEST_CHANNEL', [])))
+
+        # Forget channels that were removed from the config
+        for channel_id in set(self.channels) - set(channel_ids):
+            self.remove(channel_id)
+
+    async def refresh_forever(self, client, interval: int = CHANNEL_REFRESH_INTERVAL):
+        """Re-warm periodically so renamed channels and revoked links are picked up"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.warm(client)
+            except Exception as e:
+                print(f"WARNING: Channel metadata refresh failed: {e}")
+
+
+channel_store = ChannelStore()
@@ -1,56 +1,23 @@
-import asyncio
 from datetime import datetime, timedelta
-from bot.database import get_user_command_count, increment_command_count, is_verified, is_premium_user
+from bot.database import consume_free_command
+from bot.database.entitlements import get_entitlement
 from bot.database.premium_db import use_premium_token
 from bot.database.command_usage_db import reset_command_count
 from info import Config
+from .locks import LockRegistry
 
-# User locks to prevent race conditions
-_user_locks = {}
+# User locks to prevent race conditions; idle locks are evicted
+user_locks = LockRegistry()
 
 async def check_command_limit(user_id: int) -> tuple[bool, int]:
     """
     Check if user has exceeded command limit
     Returns: (needs_verification, remaining_commands)
     """
-    # Skip verification for admins and owner only
-    if user_id in Config.ADMINS or user_id == Config.OWNER_ID:
-        print(f"DEBUG: User {user_id} has unlimited access (admin/owner)")
-        return False, -1  # -1 means unlimited
-
-    # Check if user is premium and get their token count
-    if await is_premium_user(user_id):
-        from bot.database.premium_db import get_premium_info
-        premium_info = await get_premium_info(user_id)
-        
-        if premium_info:
-            tokens_remaining = premium_info.get('tokens_remaining', 0)
-            
-            if tokens_remaining == -1:  # Unlimited plan
-                print(f"DEBUG: Premium user {user_id} has unlimited access")
-                return False, -1
-            elif tokens_remaining > 0:  # Token-based plan
-                print(f"DEBUG: Premium user {user_id} has {tokens_remaining} tokens remaining")
-                return False, tokens_remaining
-            else:  # No tokens left
-                print(f"DEBUG: Premium user {user_id} has no tokens left")
-                return True, 0
-        else:
-            print(f"DEBUG: Premium user {user_id} has no premium info - treating as expired")
-            return True, 0
-
-    # Handle regular free users
-    command_count = await get_user_command_count(user_id)
-    print(f"DEBUG: User {user_id} command count check: {command_count}/3")
-
-    # Every user gets exactly 3 commands before needing verification
-    max_commands = 3
-
-    if command_count >= max_commands:
-        return True, 0  # Need verification to get next 3 commands
-
-    remaining = max_commands - command_count
-    return False, remaining
+    entitlement = await get_entitlement(user_id)
+    needs_verification, remaining = entitlement.command_status()
+    print(f"DEBUG: User {user_id} command limit check: needs_verification={needs_verification}, remaining={remaining}")
+    return needs_verification, remaining
 
 async def reset_user_commands(user_id: int) -> bool:
     """Reset user command count - alias for reset_command_count"""
@@ -71,14 +38,13 @@ async def use_command(user_id: int) -> bool:
             print(f"DEBUG: User {user_id} has unlimited access (admin/owner)")
             return True
 
-        # Get or create user-specific lock
-        if user_id not in _user_locks:
-            _user_locks[user_id] = asyncio.Lock()
+        # Quota checks are atomic in MongoDB; the lock only keeps one user's
+        # concurrent requests from each loading the entitlement
+        async with user_locks.lock(user_id):
+            entitlement = await get_entitlement(user_id)
 
-        async with _user_locks[user_id]:
-            # Check if user is premium and handle token deduction
-            if await is_premium_user(user_id):
-                from bot.database.premium_db import use_premium_token
+            # Premium users spend a token (unlimited plans just pass while unexpired)
+            if entitlement.is_premium:
                 if await use_premium_token(user_id):
                     print(f"DEBUG: Premium user {user_id} used a token successfully")
                     return True
@@ -86,32 +52,13 @@ async def use_command(user_id: int) -> bool:
                     print(f"DEBUG: Premium user {user_id} has no tokens left - premium expired")
                     return False
 
-            # Handle regular users with free commands
-            current_count = await get_user_command_count(user_id)
-            print(f"DEBUG: User {user_id} current command count: {current_count}")
+            # Regular users: check-and-increment of the free quota in one update
+            if await consume_free_command(user_id):
+                return True
 
-            # Check if user has reached the limit (3 free commands)
-            if current_count >= 3:
-                print(f"DEBUG: User {user_id} reached command limit")
-                return False
-
-            # Increment command count atomically for regular users
-            await increment_command_count(user_id)
-            print(f"DEBUG: Incremented command count for user {user_id} to {current_count + 1}")
-            return True
+            print(f"DEBUG: User {user_id} reached command limit")
+            return False
 
     except Exception as e:
         print(f"Error in use_command: {e}")
         return False
-
-async def reset_user_commands(user_id):
-    """Reset user command count"""
-    try:
-        from bot.database.connection import db
-        from info import Config
-        collection = db[Config.COMMAND_USAGE_COLLECTION]
-        await collection.delete_one({'user_id': user_id})
-        return True
-    except Exception as e:
-        logger.error(f"Error resetting user commands: {e}")
-        return False
\ No newline at end of file
@@ -0,0 +1,280 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from pyrogram.errors import FloodWait
+from info import Config
+from .message_cache import get_cached_posts
+
+# Minimum gap between two messages to the same chat. Telegram tolerates short
+# bursts in private chats but starts returning FloodWait above ~1 msg/s sustained.
+PER_CHAT_INTERVAL = 0.35
+# Bot-wide ceiling across all chats (Telegram allows about 30 msg/s)
+GLOBAL_RATE = 25
+GET_MESSAGES_BATCH = 200
+
+
+class RateAwareSender:
+    """Paces sends per chat and globally instead of sleeping a fixed time after each one"""
+
+    def __init__(self, per_chat_interval: float = PER_CHAT_INTERVAL, global_rate: int = GLOBAL_RATE):
+        self.per_chat_interval = per_chat_interval
+        self.global_interval = 1 / global_rate
+        self._next_chat_slot = {}
+        self._next_global_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _reserve_slot(self, chat_id: int) -> float:
+        """Reserve the next free send time for chat_id and return how long to wait"""
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_chat_slot.get(chat_id, 0.0), self._next_global_slot)
+            self._next_chat_slot[chat_id] = slot + self.per_chat_interval
+            self._next_global_slot = slot + self.global_interval
+
+            # Forget chats whose slot has passed so the dict stays small
+            if len(self._next_chat_slot) > 10000:
+                self._next_chat_slot = {k: v for k, v in self._next_chat_slot.items() if v > now}
+            return slot - now
+
+    def _push_back(self, chat_id: int, seconds: float):
+        """Delay every later send to chat_id after a FloodWait"""
+        resume_at = time.monotonic() + seconds
+        self._next_chat_slot[chat_id] = max(self._next_chat_slot.get(chat_id, 0.0), resume_at)
+
+    async def send(self, chat_id: int, send_func, *args, **kwargs):
+        """Await send_func(*args, **kwargs) in chat_id's next free slot, retrying once on FloodWait"""
+        delay = await self._reserve_slot(chat_id)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            return await send_func(*args, **kwargs)
+        except FloodWait as e:
+            self._push_back(chat_id, e.value)
+            await asyncio.sleep(e.value)
+            return await send_func(*args, **kwargs)
+
+
+# Shared by every handler so concurrent requests to one chat are paced together
+sender = RateAwareSender()
+
+
+def parse_message_id(file_id: str):
+    """Return the channel message id from an index _id ("chat_message" or "message"), or None"""
+    try:
+        message_id = int(file_id.split('_')[-1]) if '_' in file_id else int(file_id)
+    except (ValueError, IndexError):
+        return None
+    return message_id if message_id > 0 else None
+
+
+async def fetch_index_messages(client, file_docs: list):
+    """
+    Resolve the channel posts for index documents through the message cache,
+    fetching misses with batched get_messages calls.
+    Returns ([(file_doc, CachedPost), ...] in input order, [error, ...]).
+    """
+    errors = []
+    wanted = []
+    for idx, file_data in enumerate(file_docs):
+        if not isinstance(file_data, dict):
+            errors.append(f"Invalid data structure for file {idx + 1}")
+            continue
+        file_id = str(file_data.get('_id', ''))
+        if not file_id:
+            errors.append(f"Missing file_id for: {file_data.get('file_name', 'Unknown File')}")
+            continue
+        message_id = parse_message_id(file_id)
+        if message_id is None:
+            errors.append(f"Invalid ID format: {file_id}")
+            continue
+        wanted.append((file_data, message_id))
+
+    if not wanted:
+        return [], errors
+
+    message_ids = list(dict.fromkeys(message_id for _, message_id in wanted))
+    batches = [message_ids[i:i + GET_MESSAGES_BATCH] for i in range(0, len(message_ids), GET_MESSAGES_BATCH)]
+
+    async def fetch_batch(batch):
+        # Hot files are answered by the message cache; only misses reach Telegram
+        try:
+            return await get_cached_posts(client, Config.INDEX_CHANNEL_ID, batch)
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+            return await get_cached_posts(client, Config.INDEX_CHANNEL_ID, batch)
+
+    fetched = {}
+    for batch, result in zip(batches, await asyncio.gather(*(fetch_batch(b) for b in batches), return_exceptions=True)):
+        if isinstance(result, Exception):
+            errors.append(f"Get messages {batch[0]}..{batch[-1]}: {result}")
+            continue
+        fetched.update(result)
+
+    candidates = []
+    for file_data, message_id in wanted:
+        post = fetched.get(message_id)
+        if not post or not post.media:
+            errors.append(f"Message {message_id} invalid or no media")
+            continue
+        candidates.append((file_data, post))
+
+    return candidates, errors
+
+
+async def send_media(client, chat_id: int, post, reply_markup=None):
+    """Send a cached channel post's media to chat_id without its caption, paced by the shared sender"""
+    return await sender.send(
+        chat_id, post.send, client, chat_id,
+        caption="", reply_markup=reply_markup, protect_content=Config.PROTECT_CONTENT
+    )
+
+
+class SelectionStrategy(ABC):
+    """Chooses which index documents a browse request should try to deliver"""
+
+    name = "base"
+
+    @abstractmethod
+    async def select(self, user_id: int) -> list:
+        """Index documents to try for user_id, in delivery order"""
+
+    async def after_delivery(self, user_id: int, selected: list, sent: list):
+        """Hook for strategies that keep per-user state (e.g. page cursors)"""
+
+
+class CursorStrategy(SelectionStrategy):
+    """Walks a keyset-paginated listing, remembering each user's position and wrapping at the end"""
+
+    def __init__(self, name: str, fetch_page, sort_field: str, cursors: dict, page_size: int = 10):
+        self.name = name
+        self.fetch_page = fetch_page
+        self.sort_field = sort_field
+        self.cursors = cursors
+        self.page_size = page_size
+
+    async def select(self, user_id: int) -> list:
+        cursor = self.cursors.get(user_id)
+        results = await self.fetch_page(limit=self.page_size, cursor=cursor)
+
+        # Wrap around to the first page if no more files
+        if not results and cursor:
+            self.cursors.pop(user_id, None)
+            results = await self.fetch_page(limit=self.page_size)
+            print(f"DEBUG: Reset {self.name} cursor for user {user_id}, retrieved {len(results)} files")
+        return results
+
+    async def after_delivery(self, user_id: int, selected: list, sent: list):
+        from bot.database.index_db import encode_page_cursor
+
+        # Continue after the last file processed next time
+        if selected:
+            self.cursors[user_id] = encode_page_cursor(selected[-1], self.sort_field)
+
+
+class DeliveryReport:
+    """Outcome of one browse request"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.selected = []
+        self.sent = []
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def sent_count(self) -> int:
+        return len(self.sent)
+
+
+class DeliveryMetrics:
+    """In-process counters for every delivery made through an engine"""
+
+    def __init__(self):
+        self.by_mode = {}
+
+    def record(self, report: DeliveryReport):
+        stats = self.by_mode.setdefault(report.mode, {
+            "requests": 0, "files_sent": 0, "errors": 0, "empty": 0, "total_seconds": 0.0
+        })
+        stats["requests"] += 1
+        stats["files_sent"] += report.sent_count
+        stats["errors"] += len(report.errors)
+        stats["empty"] += 0 if report.sent else 1
+        stats["total_seconds"] += report.elapsed
+
+    def snapshot(self) -> dict:
+        snapshot = {}
+        for mode, stats in self.by_mode.items():
+            snapshot[mode] = dict(stats, avg_seconds=stats["total_seconds"] / stats["requests"] if stats["requests"] else 0.0)
+        return snapshot
+
+
+class DeliveryEngine:
+    """
+    Select -> batch fetch -> paced concurrent send -> bulk access count.
+    The fetch and send steps are pluggable so every browse mode shares one pipeline.
+    """
+
+    def __init__(self, fetch=fetch_index_messages, send=send_media, metrics: DeliveryMetrics = None):
+        self.fetch = fetch
+        self.send = send
+        self.metrics = metrics or DeliveryMetrics()
+
+    async def _send_all(self, client, chat_id: int, candidates: list, target_count: int, reply_markup, report: DeliveryReport):
+        """Send up to target_count candidates concurrently, topping up from the rest when a send fails"""
+        remaining = list(candidates)
+
+        while remaining and report.sent_count < target_count:
+            wave = remaining[:target_count - report.sent_count]
+            remaining = remaining[len(wave):]
+
+            results = await asyncio.gather(
+                *(self.send(client, chat_id, post, reply_markup) for _, post in wave),
+                return_exceptions=True
+            )
+            for (file_data, post), result in zip(wave, results):
+                if isinstance(result, Exception):
+                    print(f"ERROR: Failed to send message {post.id}: {result}")
+                    report.errors.append(f"Send error for {post.id}: {result}")
+                elif result is None:
+                    report.errors.append(f"Send failed for message {post.id}")
+                else:
+                    report.sent.append(file_data)
+
+    async def deliver(self, client, chat_id: int, strategy: SelectionStrategy, target_count: int = 5, reply_markup=None, on_selected=None) -> DeliveryReport:
+        """Run one browse request for chat_id; selection errors propagate to the caller"""
+        from bot.database.index_db import increment_access_counts
+
+        report = DeliveryReport(strategy.name)
+        started = time.monotonic()
+        try:
+            report.selected = await strategy.select(chat_id)
+            print(f"DEBUG: {strategy.name} strategy selected {len(report.selected)} files for {chat_id}")
+            if not report.selected:
+                return report
+
+            if on_selected:
+                await on_selected(report)
+
+            # Fetch every candidate in one batched call, then send them through the paced sender
+            candidates, fetch_errors = await self.fetch(client, report.selected)
+            report.errors.extend(fetch_errors)
+            print(f"DEBUG: {len(candidates)} of {len(report.selected)} {strategy.name} files are deliverable")
+
+            await self._send_all(client, chat_id, candidates, target_count, reply_markup, report)
+
+            # Increment access counts in one round-trip
+            try:
+                await increment_access_counts([str(doc['_id']) for doc in report.sent])
+            except Exception as count_error:
+                print(f"WARNING: Failed to increment access counts: {count_error}")
+
+            await strategy.after_delivery(chat_id, report.selected, report.sent)
+            return report
+        finally:
+            report.elapsed = time.monotonic() - started
+            self.metrics.record(report)
+
+
+# Shared engine used by every browse mode
+delivery_engine = DeliveryEngine()
@@ -0,0 +1,583 @@
+import asyncio
+import time
+from bson import ObjectId
+from pyrogram import enums
+from pyrogram.errors import FloodWait, MessageNotModified
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from info import Config
+
+CRAWL_BATCH_SIZE = 200     # Message ids per get_messages call (Telegram's maximum)
+CRAWL_QUEUE_SIZE = 4       # Fetched batches buffered ahead of the DB writer
+MAX_FLOOD_RETRIES = 5
+FETCH_RETRIES = 3          # Attempts per batch on other fetch errors
+FETCH_RETRY_DELAY = 2      # Seconds before retrying a failed batch
+INDEX_FLUSH_SIZE = 500     # Documents per bulk_write
+INDEX_FLUSH_DELAY = 2      # Seconds a buffered document may wait before it is written
+CHECKPOINT_BATCHES = 5     # Fetched batches between saved job checkpoints
+PROGRESS_EDIT_INTERVAL = 3 # Seconds between progress message edits
+WORKER_POLL_INTERVAL = 5   # Seconds between an indexing worker's queue polls
+WORKER_LEASE = 60          # Seconds a worker's claim on a job lasts without renewal
+
+INDEXABLE_MEDIA = (enums.MessageMediaType.VIDEO, enums.MessageMediaType.AUDIO, enums.MessageMediaType.DOCUMENT)
+
+
+class CrawlStats:
+    """Counters shown while indexing a channel and in the final summary"""
+
+    def __init__(self, counts: dict = None):
+        counts = counts or {}
+        self.fetched = counts.get("fetched", 0)
+        self.saved = counts.get("saved", 0)
+        self.duplicate = counts.get("duplicate", 0)
+        self.deleted = counts.get("deleted", 0)
+        self.no_media = counts.get("no_media", 0)
+        self.unsupported = counts.get("unsupported", 0)
+        self.errors = counts.get("errors", 0)
+        self.index_errors = counts.get("index_errors", 0)
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    def absorb(self, counts: dict):
+        """Take the saved/duplicate/error totals from an IndexWriter"""
+        self.saved = counts["inserted"] + counts["updated"]
+        self.duplicate = counts["duplicate"]
+        self.index_errors = counts["errors"]
+
+    def progress_text(self) -> str:
+        return (f"Total messages fetched: <code>{self.fetched}</code>\n"
+                f"Total messages saved: <code>{self.saved}</code>\n"
+                f"Duplicate Files Skipped: <code>{self.duplicate}</code>\n"
+                f"Deleted Messages Skipped: <code>{self.deleted}</code>\n"
+                f"Non-Media messages skipped: <code>{self.no_media + self.unsupported}</code>\n"
+                f"Errors Occurred: <code>{self.errors + self.index_errors}</code>")
+
+    def summary_text(self) -> str:
+        return (f"Successfully saved <code>{self.saved}</code> files to database!\n"
+                f"Duplicate Files Skipped: <code>{self.duplicate}</code>\n"
+                f"Deleted Messages Skipped: <code>{self.deleted}</code>\n"
+                f"Non-Media messages skipped: <code>{self.no_media + self.unsupported}</code>\n"
+                f"Errors Occurred: <code>{self.errors + self.index_errors}</code>")
+
+
+class IndexWriter:
+    """
+    Buffers file index documents and writes them with one unordered bulk_write
+    once flush_size are pending or the oldest has waited flush_delay seconds.
+    counts keeps running totals of inserted, updated, duplicate and failed files.
+    """
+
+    def __init__(self, flush_size: int = INDEX_FLUSH_SIZE, flush_delay: float = INDEX_FLUSH_DELAY, counts: dict = None):
+        self.flush_size = flush_size
+        self.flush_delay = flush_delay
+        # {_id: document}; a file queued twice is written once
+        self._pending = {}
+        self._timer = None
+        self.counts = {"inserted": 0, "updated": 0, "duplicate": 0, "errors": 0}
+        self.counts.update(counts or {})
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def add(self, file_id: str, file_name: str, file_type: str, file_size: int, caption: str = "", user_id: int = None):
+        """Queue one file (same arguments as add_to_index)"""
+        from bot.database import build_index_document
+
+        try:
+            document = build_index_document(file_id, file_name, file_type, file_size, caption, user_id)
+        except Exception as e:
+            print(f"ERROR: Could not build index document for {file_id}: {e}")
+            self.counts["errors"] += 1
+            return
+
+        if document["_id"] in self._pending:
+            self.counts["duplicate"] += 1
+        self._pending[document["_id"]] = document
+
+        if len(self._pending) >= self.flush_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self) -> dict:
+        """Write everything queued so far; returns the counts of this batch"""
+        from bot.database import bulk_index
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        documents = list(self._pending.values())
+        self._pending = {}
+        try:
+            batch = await bulk_index(documents)
+        except Exception as e:
+            print(f"ERROR: Bulk index write of {len(documents)} files failed: {e}")
+            batch = {"inserted": 0, "updated": 0, "duplicate": 0, "errors": len(documents)}
+
+        for key, value in batch.items():
+            self.counts[key] += value
+        if documents:
+            print(f"DEBUG: Indexed {len(documents)} files: {batch}")
+        return batch
+
+
+# Shared writer for files indexed one at a time as they are posted
+index_writer = IndexWriter()
+
+
+def file_doc_from_message(message, chat) -> dict:
+    """add_to_index arguments for an indexable media message, or None"""
+    media = getattr(message, message.media.value, None) if message.media else None
+    if not media:
+        return None
+    return {
+        # Unique file id from chat and message id
+        "file_id": f"{chat}_{message.id}",
+        "file_name": getattr(media, 'file_name', None) or message.caption or f"File_{message.id}",
+        "file_type": message.media.value,
+        "file_size": getattr(media, 'file_size', 0),
+        "caption": message.caption or '',
+        "user_id": message.from_user.id if message.from_user else 0,
+    }
+
+
+async def fetch_batch(bot, chat, message_ids: list) -> list:
+    """One get_messages call for up to CRAWL_BATCH_SIZE ids, waiting out FloodWait for this batch only"""
+    for _ in range(MAX_FLOOD_RETRIES):
+        try:
+            messages = await bot.get_messages(chat, message_ids)
+            return messages if isinstance(messages, list) else [messages]
+        except FloodWait as e:
+            print(f"WARNING: FloodWait {e.value}s while fetching {message_ids[0]}..{message_ids[-1]}")
+            await asyncio.sleep(e.value)
+    return await bot.get_messages(chat, message_ids)
+
+
+async def crawl_channel(bot, chat, start_id: int, stats: CrawlStats = None, should_cancel=lambda: False,
+                        on_batch=None, on_checkpoint=None, batch_size: int = CRAWL_BATCH_SIZE) -> CrawlStats:
+    """
+    Index every media message of chat from start_id down to 1.
+    A fetcher requests ids in ranges of batch_size while a writer indexes the
+    previous batches through an IndexWriter; the bounded queue between them
+    keeps memory flat.
+    on_batch(stats) is awaited after each batch; on_checkpoint(next_id, stats)
+    every CHECKPOINT_BATCHES batches, once everything above next_id is written.
+    """
+    stats = stats or CrawlStats()
+    index = IndexWriter(counts={"inserted": stats.saved, "duplicate": stats.duplicate, "errors": stats.index_errors})
+    queue = asyncio.Queue(maxsize=CRAWL_QUEUE_SIZE)
+
+    async def fetcher():
+        top = start_id
+        while top > 0 and not should_cancel():
+            message_ids = list(range(top, max(top - batch_size, 0), -1))
+            messages = None
+            for attempt in range(1, FETCH_RETRIES + 1):
+                try:
+                    messages = await fetch_batch(bot, chat, message_ids)
+                    break
+                except Exception as e:
+                    print(f"ERROR: Error fetching messages {message_ids[0]}..{message_ids[-1]} (attempt {attempt}): {e}")
+                    if attempt < FETCH_RETRIES:
+                        await asyncio.sleep(FETCH_RETRY_DELAY)
+            if messages is None:
+                stats.errors += 1
+            await queue.put((message_ids, messages))
+            top -= batch_size
+        await queue.put(None)
+
+    async def checkpoint(next_id):
+        await index.flush()
+        stats.absorb(index.counts)
+        if on_checkpoint:
+            await on_checkpoint(next_id, stats)
+
+    async def writer():
+        batches = 0
+        # Top of the first range that could not be fetched; checkpoints stay
+        # there so a resumed job fetches it again
+        failed_top = None
+        while True:
+            item = await queue.get()
+            if item is None or should_cancel():
+                return
+            message_ids, messages = item
+
+            batches += 1
+            if batches % CHECKPOINT_BATCHES == 0:
+                # Checkpoint before this batch: everything above it is written
+                await checkpoint(failed_top or message_ids[0])
+
+            if messages is None:
+                # The whole range failed to fetch and was counted as an error
+                failed_top = failed_top or message_ids[0]
+                stats.fetched += len(message_ids)
+                continue
+
+            found = {message.id for message in messages if message and not message.empty}
+            stats.fetched += len(message_ids)
+            stats.deleted += len(message_ids) - len(found)
+
+            to_index = []
+            for message in messages:
+                if not message or message.empty:
+                    continue
+                if not message.media:
+                    stats.no_media += 1
+                elif message.media not in INDEXABLE_MEDIA or not getattr(message, message.media.value, None):
+                    stats.unsupported += 1
+                else:
+                    to_index.append(message)
+
+            for message in to_index:
+                await index.add(**file_doc_from_message(message, chat))
+            stats.absorb(index.counts)
+
+            if on_batch:
+                await on_batch(stats)
+
+    fetch_task = asyncio.create_task(fetcher())
+    try:
+        await writer()
+    finally:
+        fetch_task.cancel()
+        await index.flush()
+        stats.absorb(index.counts)
+    return stats
+
+
+def history_file_fields(message, chat) -> dict:
+    """add_to_index arguments for a video, document, photo or audio post, or None"""
+    media_type = "unknown"
+    file_size = 0
+    file_name = message.caption or f"File_{message.id}"
+
+    if message.video:
+        media_type = "video"
+        file_size = message.video.file_size or 0
+        if message.video.file_name:
+            file_name = message.video.file_name
+    elif message.document:
+        media_type = "document"
+        file_size = message.document.file_size or 0
+        if message.document.file_name:
+            file_name = message.document.file_name
+    elif message.photo:
+        media_type = "photo"
+        file_size = getattr(message.photo, 'file_size', 0)
+    elif message.audio:
+        media_type = "audio"
+        file_size = message.audio.file_size or 0
+        if message.audio.file_name:
+            file_name = message.audio.file_name
+    else:
+        return None
+
+    return {
+        "file_id": f"{chat}_{message.id}",
+        "file_name": file_name,
+        "file_type": media_type,
+        "file_size": file_size,
+        "caption": message.caption or '',
+        "user_id": message.from_user.id if message.from_user else 0,
+    }
+
+
+async def crawl_history(bot, chat, stop_id: int = 0, offset_id: int = 0, stats: CrawlStats = None,
+                        should_cancel=lambda: False, on_batch=None, on_checkpoint=None,
+                        batch_size: int = CRAWL_BATCH_SIZE) -> CrawlStats:
+    """
+    Index media posts of chat newer than stop_id, reading history newest first
+    (older than offset_id when resuming). on_batch(stats) is awaited every
+    batch_size messages; on_checkpoint(next_id, stats) every CHECKPOINT_BATCHES
+    batches, once every message above next_id is written.
+    """
+    stats = stats or CrawlStats()
+    index = IndexWriter(counts={"inserted": stats.saved, "duplicate": stats.duplicate, "errors": stats.index_errors})
+    read = 0
+
+    async for message in bot.get_chat_history(chat, offset_id=offset_id):
+        # History is newest first, so the rest is already indexed
+        if message.id <= stop_id or should_cancel():
+            break
+
+        if read and read % (batch_size * CHECKPOINT_BATCHES) == 0:
+            await index.flush()
+            stats.absorb(index.counts)
+            if on_checkpoint:
+                await on_checkpoint(message.id + 1, stats)
+
+        read += 1
+        stats.fetched += 1
+        if message.empty:
+            stats.deleted += 1
+        elif not message.media:
+            stats.no_media += 1
+        else:
+            fields = history_file_fields(message, chat)
+            if fields is None:
+                stats.unsupported += 1
+            else:
+                await index.add(**fields)
+
+        if read % batch_size == 0:
+            stats.absorb(index.counts)
+            if on_batch:
+                await on_batch(stats)
+
+    await index.flush()
+    stats.absorb(index.counts)
+    return stats
+
+
+async def verify_indexed_sample(bot, channel_id: int, size: int) -> int:
+    """
+    Re-fetch a random sample of channel_id's indexed files (one get_messages
+    call) and drop those whose message was deleted. Returns how many were removed.
+    """
+    from bot.database import sample_channel_file_ids, remove_files_from_index
+
+    file_ids = await sample_channel_file_ids(channel_id, min(size, CRAWL_BATCH_SIZE))
+    if not file_ids:
+        return 0
+
+    by_message_id = {}
+    for file_id in file_ids:
+        try:
+            by_message_id[int(file_id.rpartition("_")[2])] = file_id
+        except ValueError:
+            continue
+
+    messages = await fetch_batch(bot, channel_id, list(by_message_id))
+    gone = [by_message_id[message.id] for message in messages if message and message.empty and message.id in by_message_id]
+    removed = await remove_files_from_index(gone)
+    print(f"DEBUG: Verified {len(by_message_id)} indexed files of {channel_id}, removed {removed} deleted")
+    return removed
+
+
+def _history_text(stats: CrawlStats, state: str) -> str:
+    """Status text of a /indexchannel job; state is running, cancelled or done"""
+    non_media = stats.no_media + stats.unsupported
+    errors = stats.errors + stats.index_errors
+    if state == "running":
+        return (f"🔍 **Indexing in progress...**\n\n"
+                f"📊 **Current Statistics:**\n"
+                f"• Messages processed: {stats.fetched}\n"
+                f"• Files indexed: {stats.saved}\n"
+                f"• Duplicates skipped: {stats.duplicate}\n"
+                f"• Non-media messages: {non_media}\n"
+                f"• Errors: {errors}")
+    header = "❌ Indexing cancelled!\n\n📊 **Statistics:**" if state == "cancelled" else "✅ **Indexing completed!**\n\n📊 **Final Statistics:**"
+    return (f"{header}\n"
+            f"• Messages processed: {stats.fetched}\n"
+            f"• Files indexed: {stats.saved}\n"
+            f"• Duplicates skipped: {stats.duplicate}\n"
+            f"• Deleted messages: {stats.deleted}\n"
+            f"• Non-media messages: {non_media}\n"
+            f"• Errors: {errors}")
+
+
+class IndexJobs:
+    """
+    Channel crawls persisted in MongoDB. Each job checkpoints its next message
+    id and counters every few batches, so a crawl interrupted by a restart
+    resumes where it stopped (at most CHECKPOINT_BATCHES batches are fetched
+    twice). Several channels can be crawled at once; one job per channel.
+    With INDEX_WORKER set the bot only queues jobs and a separate
+    index_worker.py process claims and runs them (see serve).
+    """
+
+    def __init__(self):
+        # {job_id: {"chat": chat, "cancel": bool, "task": Task}}
+        self.active = {}
+        # Messages to skip from the latest one for the next job (/setskip)
+        self.skip = 0
+
+    async def is_indexing(self, chat) -> bool:
+        """Whether chat has a job here or, with a worker, anywhere"""
+        from bot.database.index_jobs_db import find_active_index_job
+
+        if any(entry["chat"] == chat for entry in self.active.values()):
+            return True
+        return Config.INDEX_WORKER and await find_active_index_job(chat) is not None
+
+    async def cancel(self, job_id: str) -> bool:
+        from bot.database.index_jobs_db import request_index_cancel
+
+        entry = self.active.get(job_id)
+        if entry is not None:
+            entry["cancel"] = True
+            return True
+        if Config.INDEX_WORKER and ObjectId.is_valid(job_id):
+            return await request_index_cancel(ObjectId(job_id))
+        return False
+
+    async def start(self, bot, chat, status_message, last_msg_id: int = 0, kind: str = "range", full: bool = False):
+        """
+        Start crawling chat, reporting on status_message. kind is "range" (from
+        last_msg_id down) or "history" (new posts since the last re-index).
+        Returns None if chat is already being indexed.
+        """
+        from bot.database.index_jobs_db import create_index_job
+
+        if await self.is_indexing(chat):
+            return None
+        job = await create_index_job(
+            chat, status_message.chat.id, status_message.id,
+            last_msg_id=last_msg_id, skip=self.skip if kind == "range" else 0,
+            kind=kind, full=full, queued=Config.INDEX_WORKER
+        )
+        if Config.INDEX_WORKER:
+            await self._edit_status(bot, job, "⏳ Queued for the indexing worker...")
+        else:
+            await self._edit_status(bot, job, "Starting Indexing")
+            self._spawn(bot, job)
+        return job
+
+    async def resume(self, bot):
+        """Restart jobs that were still running when the bot stopped"""
+        from bot.database.index_jobs_db import get_running_index_jobs
+
+        for job in await get_running_index_jobs():
+            if str(job["_id"]) not in self.active:
+                print(f"DEBUG: Resuming indexing of {job['chat']} from message {job['next_id']}")
+                self._spawn(bot, job)
+
+    async def serve(self, bot, worker: str, max_jobs: int = 2):
+        """
+        Worker loop: claim queued jobs up to max_jobs at a time, keep their
+        leases alive and pass on cancellations requested from the bot. A job
+        whose worker dies is claimed again once its lease runs out.
+        """
+        from bot.database.index_jobs_db import claim_index_job, renew_index_leases, get_cancel_requests
+
+        while True:
+            try:
+                job_ids = [ObjectId(job_id) for job_id in self.active]
+                await renew_index_leases(job_ids, worker, WORKER_LEASE)
+                for job_id in await get_cancel_requests(job_ids):
+                    # The job may have finished since job_ids was taken
+                    entry = self.active.get(str(job_id))
+                    if entry is not None:
+                        entry["cancel"] = True
+
+                while len(self.active) < max_jobs:
+                    job = await claim_index_job(worker, WORKER_LEASE)
+                    if job is None:
+                        break
+                    print(f"DEBUG: Worker {worker} claimed indexing of {job['chat']} from message {job['next_id']}")
+                    self._spawn(bot, job)
+            except Exception as e:
+                print(f"ERROR: Indexing worker poll failed: {e}")
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+
+    def _spawn(self, bot, job: dict):
+        job_id = str(job["_id"])
+        entry = {"chat": job["chat"], "cancel": False}
+        entry["task"] = asyncio.create_task(self.run(bot, job, entry))
+        self.active[job_id] = entry
+        entry["task"].add_done_callback(lambda _: self.active.pop(job_id, None))
+
+    async def _edit_status(self, bot, job: dict, text: str, cancel_button: bool = True):
+        reply_markup = InlineKeyboardMarkup(
+            [[InlineKeyboardButton('Cancel', callback_data=f'index_cancel#{job["_id"]}')]]
+        ) if cancel_button else None
+        try:
+            await bot.edit_message_text(job["status_chat_id"], job["status_message_id"], text, reply_markup=reply_markup)
+        except (MessageNotModified, FloodWait):
+            pass
+        except Exception as e:
+            print(f"WARNING: Could not update indexing status: {e}")
+
+    async def run(self, bot, job: dict, entry: dict):
+        from bot.database.index_jobs_db import save_index_progress, finish_index_job
+
+        stats = CrawlStats(job["counts"])
+        history = job.get("kind") == "history"
+        last_edit = 0
+
+        async def report_progress(stats):
+            nonlocal last_edit
+            # Batches land every few hundred ms; keep clear of edit flood limits
+            if time.monotonic() - last_edit < PROGRESS_EDIT_INTERVAL:
+                return
+            last_edit = time.monotonic()
+            await self._edit_status(bot, job, _history_text(stats, "running") if history else stats.progress_text())
+
+        async def save_checkpoint(next_id, stats):
+            await save_index_progress(job["_id"], next_id, stats.to_dict())
+
+        try:
+            if history:
+                text = await self._run_history(bot, job, entry, stats, report_progress, save_checkpoint)
+            else:
+                await crawl_channel(
+                    bot, job["chat"], job["next_id"],
+                    stats=stats,
+                    should_cancel=lambda: entry["cancel"],
+                    on_batch=report_progress,
+                    on_checkpoint=save_checkpoint
+                )
+                text = stats.summary_text()
+            await finish_index_job(job["_id"], stats.to_dict(), state="cancelled" if entry["cancel"] else "done")
+        except asyncio.CancelledError:
+            # Left as running so the next start resumes it
+            raise
+        except Exception as e:
+            print(f"ERROR: Indexing of {job['chat']} failed: {e}")
+            await finish_index_job(job["_id"], stats.to_dict(), state="failed")
+            await self._edit_status(bot, job, f"❌ Error during indexing: {e}" if history else f'Error: {e}', cancel_button=False)
+            return
+
+        await self._edit_status(bot, job, text, cancel_button=False)
+
+    async def _run_history(self, bot, job: dict, entry: dict, stats: CrawlStats, report_progress, save_checkpoint) -> str:
+        """Incremental /indexchannel crawl; returns the final status text"""
+        from bot.database.index_jobs_db import get_high_water_mark, set_high_water_mark, save_index_progress
+
+        channel_id = job["chat"]
+        # The mark and the newest post are pinned on the first run of the job so a
+        # resumed crawl still stops at, and later records, the same ids
+        if "stop_id" not in job:
+            job["stop_id"] = 0 if job.get("full") else await get_high_water_mark(channel_id)
+            newest = [message async for message in bot.get_chat_history(channel_id, limit=1)]
+            job["newest_id"] = newest[0].id if newest else 0
+            await save_index_progress(job["_id"], 0, stats.to_dict(), stop_id=job["stop_id"], newest_id=job["newest_id"])
+
+        await crawl_history(
+            bot, channel_id,
+            stop_id=job["stop_id"],
+            offset_id=job["next_id"] or job["newest_id"] + 1,
+            stats=stats,
+            should_cancel=lambda: entry["cancel"],
+            on_batch=report_progress,
+            on_checkpoint=save_checkpoint
+        )
+        if entry["cancel"]:
+            return _history_text(stats, "cancelled")
+
+        # Only a complete, error-free run covers every message up to newest_id
+        if job["newest_id"] and not (stats.errors or stats.index_errors):
+            await set_high_water_mark(channel_id, job["newest_id"])
+
+        # Spot-check older files for messages deleted from the channel
+        removed = 0
+        if Config.INDEX_VERIFY_SAMPLE > 0:
+            try:
+                removed = await verify_indexed_sample(bot, channel_id, Config.INDEX_VERIFY_SAMPLE)
+            except Exception as e:
+                print(f"WARNING: Deletion check for {channel_id} failed: {e}")
+
+        return (_history_text(stats, "done")
+                + (f"\n• Already indexed up to message: {job['stop_id']}" if job["stop_id"] else "")
+                + (f"\n• Removed deleted files: {removed}" if removed else ""))
+
+
+# Shared registry of channel crawls
+index_jobs = IndexJobs()
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+LOCK_REGISTRY_SIZE = 10000   # Idle locks kept at most
+LOCK_IDLE_TTL = 300          # Seconds an unused lock is kept around
+
+
+class _Entry:
+    __slots__ = ("lock", "holders", "last_used")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.holders = 0
+        self.last_used = time.monotonic()
+
+
+class LockRegistry:
+    """
+    Per-key asyncio locks that are dropped once idle, so memory follows the
+    number of active keys rather than every key ever seen. A lock that is
+    held or awaited is never evicted.
+    """
+
+    def __init__(self, max_size: int = LOCK_REGISTRY_SIZE, idle_ttl: int = LOCK_IDLE_TTL):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._entries = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+
+    def _evict(self):
+        """Drop idle entries that expired, then the least recently used idle ones over max_size"""
+        now = time.monotonic()
+        for key in list(self._entries):
+            entry = self._entries[key]
+            # Entries are in LRU order, so stop at the first recently used one
+            if entry.last_used + self.idle_ttl > now and len(self._entries) <= self.max_size:
+                break
+            if entry.holders == 0:
+                del self._entries[key]
+                self.evicted += 1
+
+    @asynccontextmanager
+    async def lock(self, key):
+        """Hold the lock for key for the duration of the async with block"""
+        entry = self._entries.get(key)
+        created = entry is None
+        if created:
+            entry = self._entries[key] = _Entry()
+            self.created += 1
+        self._entries.move_to_end(key)
+
+        # Count ourselves as a holder before evicting so the new entry survives
+        entry.holders += 1
+        if created:
+            self._evict()
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.holders -= 1
+            entry.last_used = time.monotonic()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._entries),
+            "in_use": sum(1 for entry in self._entries.values() if entry.holders),
+            "created": self.created,
+            "evicted": self.evicted,
+        }
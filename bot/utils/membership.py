@@ -0,0 +1,99 @@
+import asyncio
+import time
+from collections import OrderedDict
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.errors import UserNotParticipant
+
+# Members rarely leave, and leaving is reported by a ChatMemberUpdated update,
+# so positive answers live long. Negative answers are short so a user who
+# just joined is let in on their next try even if no update arrives.
+MEMBERSHIP_POSITIVE_TTL = 10 * 60
+MEMBERSHIP_NEGATIVE_TTL = 20
+MEMBERSHIP_CACHE_SIZE = 50000
+# Bound on concurrent get_chat_member calls across all users, and per call
+MEMBERSHIP_CONCURRENCY = 10
+MEMBERSHIP_CHECK_TIMEOUT = 5
+
+JOINED_STATUSES = (
+    ChatMemberStatus.OWNER,
+    ChatMemberStatus.ADMINISTRATOR,
+    ChatMemberStatus.MEMBER,
+)
+# Request channels also accept restricted members and pending join requests
+JOIN_REQUESTED = "join_requested"
+REQUEST_STATUSES = JOINED_STATUSES + (ChatMemberStatus.RESTRICTED, JOIN_REQUESTED)
+
+_MISSING = object()
+
+
+class MembershipCache:
+    """Bounded LRU of (chat_id, user_id) -> member status with separate positive and negative TTLs"""
+
+    def __init__(self, max_size: int = MEMBERSHIP_CACHE_SIZE,
+                 positive_ttl: int = MEMBERSHIP_POSITIVE_TTL, negative_ttl: int = MEMBERSHIP_NEGATIVE_TTL):
+        self.max_size = max_size
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chat_id: int, user_id: int):
+        """Cached status (None meaning not a member), or _MISSING"""
+        key = (chat_id, user_id)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return _MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, chat_id: int, user_id: int, status):
+        ttl = self.positive_ttl if status in REQUEST_STATUSES else self.negative_ttl
+        key = (chat_id, user_id)
+        self._entries[key] = (status, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate_chat(self, chat_id: int):
+        """Forget every user of a channel, e.g. when it is removed from the force-sub lists"""
+        for key in [key for key in self._entries if key[0] == chat_id]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+membership_cache = MembershipCache()
+_membership_semaphore = asyncio.Semaphore(MEMBERSHIP_CONCURRENCY)
+
+
+async def get_member_status(client, chat_id: int, user_id: int):
+    """Member status of user_id in chat_id, from cache when possible; None if not a member or unknown"""
+    status = membership_cache.get(chat_id, user_id)
+    if status is not _MISSING:
+        return status
+
+    try:
+        async with _membership_semaphore:
+            member = await asyncio.wait_for(client.get_chat_member(chat_id, user_id), MEMBERSHIP_CHECK_TIMEOUT)
+        status = member.status
+    except UserNotParticipant:
+        status = None
+    except Exception as e:
+        # Transient errors are not cached; treat as not joined for this request
+        print(f"DEBUG: Membership check failed for {user_id} in {chat_id}: {e}")
+        return None
+
+    membership_cache.set(chat_id, user_id, status)
+    return status
+
+
+async def check_memberships(client, chat_ids: list, user_id: int) -> dict:
+    """Check user_id in every chat concurrently; returns {chat_id: status}"""
+    statuses = await asyncio.gather(*(get_member_status(client, chat_id, user_id) for chat_id in chat_ids))
+    return dict(zip(chat_ids, statuses))
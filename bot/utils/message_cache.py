@@ -0,0 +1,181 @@
+import time
+from collections import OrderedDict
+from pyrogram.enums import ParseMode
+
+# Channel posts are effectively immutable, so a long TTL is safe; edits and
+# deletions seen by the bot invalidate entries straight away anyway.
+MESSAGE_CACHE_SIZE = 5000
+MESSAGE_CACHE_TTL = 6 * 60 * 60
+
+MEDIA_TYPES = ("photo", "video", "document", "audio", "voice", "animation", "video_note", "sticker")
+
+
+class CachedPost:
+    """
+    The parts of a channel post needed to re-send it: media file_id, type and
+    caption. Posts that are neither media nor text are re-sent with copy_message.
+    """
+
+    __slots__ = ("chat_id", "id", "media_type", "file_id", "file_name", "caption", "reply_markup")
+
+    def __init__(self, chat_id, message_id, media_type, file_id=None, file_name=None, caption="", reply_markup=None):
+        self.chat_id = chat_id
+        self.id = message_id
+        self.media_type = media_type
+        self.file_id = file_id
+        self.file_name = file_name
+        self.caption = caption
+        self.reply_markup = reply_markup
+
+    @classmethod
+    def from_message(cls, message):
+        """Build from a pyrogram Message, or return None for empty/service messages"""
+        if not message or message.empty:
+            return None
+
+        for media_type in MEDIA_TYPES:
+            media = getattr(message, media_type, None)
+            if media is not None:
+                return cls(
+                    chat_id=message.chat.id,
+                    message_id=message.id,
+                    media_type=media_type,
+                    file_id=media.file_id,
+                    file_name=getattr(media, "file_name", None),
+                    caption=message.caption.html if message.caption else "",
+                    reply_markup=message.reply_markup,
+                )
+
+        if message.text:
+            return cls(
+                chat_id=message.chat.id,
+                message_id=message.id,
+                media_type="text",
+                caption=message.text.html,
+                reply_markup=message.reply_markup,
+            )
+
+        if message.service:
+            return None
+
+        # Polls, locations, contacts, venues...: no file_id to re-send, so send
+        # these as a copy of the original post
+        return cls(
+            chat_id=message.chat.id,
+            message_id=message.id,
+            media_type="copy",
+            caption=None,
+            reply_markup=message.reply_markup,
+        )
+
+    @property
+    def media(self) -> bool:
+        return self.media_type not in ("text", "copy")
+
+    async def send(self, client, chat_id: int, caption: str = None, reply_markup=None, protect_content: bool = False):
+        """Send this post to chat_id by file_id; caption=None keeps the original caption"""
+        if self.media_type == "copy":
+            return await client.copy_message(
+                chat_id=chat_id,
+                from_chat_id=self.chat_id,
+                message_id=self.id,
+                caption=caption,
+                parse_mode=ParseMode.HTML,
+                reply_markup=reply_markup,
+                protect_content=protect_content
+            )
+
+        caption = self.caption if caption is None else caption
+        if self.media_type == "text":
+            return await client.send_message(
+                chat_id=chat_id,
+                text=caption,
+                parse_mode=ParseMode.HTML,
+                reply_markup=reply_markup,
+                protect_content=protect_content,
+                disable_web_page_preview=True
+            )
+        return await client.send_cached_media(
+            chat_id=chat_id,
+            file_id=self.file_id,
+            caption=caption,
+            parse_mode=ParseMode.HTML,
+            reply_markup=reply_markup,
+            protect_content=protect_content
+        )
+
+
+class MessageCache:
+    """Bounded LRU of CachedPost keyed by (chat_id, message_id), with a TTL per entry"""
+
+    def __init__(self, max_size: int = MESSAGE_CACHE_SIZE, ttl: int = MESSAGE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chat_id, message_id):
+        key = (chat_id, message_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        post, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return post
+
+    def put(self, post: CachedPost):
+        key = (post.chat_id, post.id)
+        self._entries[key] = (post, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, chat_id, message_id):
+        self._entries.pop((chat_id, message_id), None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+message_cache = MessageCache()
+
+
+async def get_cached_posts(client, chat_id, message_ids: list, batch_size: int = 200) -> dict:
+    """
+    Resolve posts from the cache, fetching only the misses from Telegram in
+    batched get_messages calls. Returns {message_id: CachedPost}; ids that
+    are missing or empty are left out. FloodWait and RPC errors propagate.
+    """
+    found = {}
+    misses = []
+    for message_id in dict.fromkeys(message_ids):
+        post = message_cache.get(chat_id, message_id)
+        if post is not None:
+            found[message_id] = post
+        else:
+            misses.append(message_id)
+
+    for i in range(0, len(misses), batch_size):
+        batch = misses[i:i + batch_size]
+        messages = await client.get_messages(chat_id, batch)
+        if not isinstance(messages, list):
+            messages = [messages]
+        for message in messages:
+            post = CachedPost.from_message(message)
+            if post is None:
+                continue
+            # Cache under the id we asked with, which may be a username for public channels
+            post.chat_id = chat_id
+            message_cache.put(post)
+            found[post.id] = post
+
+    return found
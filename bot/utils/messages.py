@@ -2,21 +2,23 @@
 
 import re, asyncio
 from pyrogram.errors import FloodWait
+from .message_cache import get_cached_posts
 
 async def get_messages(client, message_ids):
-    messages, total = [], 0
+    """Resolve DB channel posts in order, serving repeats from the message cache"""
+    message_ids = list(message_ids)
+    posts, total = {}, 0
     while total != len(message_ids):
         batch = message_ids[total:total+200]
         try:
-            msgs = await client.get_messages(client.db_channel.id, batch)
+            posts.update(await get_cached_posts(client, client.db_channel.id, batch))
         except FloodWait as e:
             await asyncio.sleep(e.x)
-            msgs = await client.get_messages(client.db_channel.id, batch)
+            posts.update(await get_cached_posts(client, client.db_channel.id, batch))
         except Exception:
-            msgs = []
+            pass
         total += len(batch)
-        messages.extend(msgs)
-    return messages
+    return [posts[message_id] for message_id in message_ids if message_id in posts]
 
 async def get_message_id(client, message):
     if message.forward_from_chat and message.forward_from_chat.id == client.db_channel.id:
@@ -2,12 +2,25 @@
 # Modified & extended by: @Mak0912 (TG)
 
 import datetime
+import math
+import secrets
 import tzlocal
 import asyncio
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from pyrogram import Client
 from info import Config
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from .timing_wheel import TimingWheel
+
+# Tasks scheduled by this process wait in an in-memory timing wheel; MongoDB
+# keeps every task so a poller can take over those left by a restart or crash
+WHEEL_TICK = 1                 # Seconds per wheel tick
+DELETE_COALESCE_WINDOW = 10    # Deletions due within the same window run together
+POLL_INTERVAL = 30             # Seconds between polls for due tasks nobody holds
+POLL_BATCH_SIZE = 500          # Tasks leased per round-trip
+LEASE_GRACE = 120              # Seconds past run_time before a poller takes over a task
+DELETE_CHUNK_SIZE = 100        # Telegram's limit for one delete_messages call
+MAX_RETRIEVE_BUTTONS = 10      # Retrieve links shown on one batch notice
 
 class ScheduleManager:
     def __init__(self) -> None:
@@ -15,146 +28,193 @@ class ScheduleManager:
             timezone=tzlocal.get_localzone(),
             misfire_grace_time=5,
         )
+        self.client = None
+        self._poll_lock = asyncio.Lock()
+        self.wheel = TimingWheel(tick=WHEEL_TICK)
+        self.lease = secrets.token_hex(8)
 
-    async def start(self) -> None:
+    async def start(self, client: Client = None) -> None:
         """
-        Starts the scheduler and recovers pending tasks.
+        Starts the scheduler and the due-task poller, which also picks up tasks left from before a restart.
         """
-        self.scheduler.start()
-        print("DEBUG: Scheduler started successfully")
-        await self.recover_pending_tasks()
+        self.client = client
 
-    async def recover_pending_tasks(self) -> None:
-        """
-        Recover pending delete tasks from database on bot restart.
-        """
+        # Tasks saved before run_time was stored as a date are invisible to the poll
         try:
-            from bot.database.auto_delete_db import get_all_delete_tasks
-            pending_tasks = await get_all_delete_tasks()
+            from bot.database.auto_delete_db import migrate_string_run_times
+            migrated = await migrate_string_run_times()
+            if migrated:
+                print(f"DEBUG: Converted run_time of {migrated} older delete tasks")
+        except Exception as e:
+            print(f"ERROR: Failed to convert older delete tasks: {e}")
+
+        self.scheduler.add_job(
+            func=self.run_due_tasks,
+            trigger="interval",
+            seconds=POLL_INTERVAL,
+            id="auto_delete_poll",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+            next_run_time=datetime.datetime.now(tz=tzlocal.get_localzone())
+        )
+        self.scheduler.add_job(
+            func=self.run_wheel,
+            trigger="interval",
+            seconds=WHEEL_TICK,
+            id="auto_delete_wheel",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        self.scheduler.start()
+        print("DEBUG: Scheduler started successfully")
 
-            if not pending_tasks:
-                print("DEBUG: No pending delete tasks found")
-                return
+    def _get_client(self):
+        if self.client is not None:
+            return self.client
 
-            current_time = datetime.datetime.now(tz=tzlocal.get_localzone())
-            recovered_count = 0
-
-            for task in pending_tasks:
-                try:
-                    # Parse run_time
-                    if isinstance(task['run_time'], str):
-                        run_time = datetime.datetime.fromisoformat(task['run_time'])
-                        if run_time.tzinfo is None:
-                            run_time = run_time.replace(tzinfo=tzlocal.get_localzone())
-                    else:
-                        run_time = task['run_time']
-
-                    # If task time has passed, skip it
-                    if run_time <= current_time:
-                        from bot.database.auto_delete_db import delete_saved_task
-                        await delete_saved_task(task['_id'])
-                        continue
-
-                    # Re-schedule the task
-                    self.scheduler.add_job(
-                        func=self.delete_messages,
-                        trigger="date",
-                        run_date=run_time,
-                        args=[None, task['chat_id'], task['message_ids'], task['base64_file_link'], task['_id']],
-                        id=task['_id'],
-                        misfire_grace_time=60,
-                        replace_existing=True
-                    )
-                    recovered_count += 1
-
-                except Exception as e:
-                    print(f"ERROR recovering task {task.get('_id', 'unknown')}: {e}")
-                    continue
-
-            print(f"DEBUG: Recovered {recovered_count} pending delete tasks")
+        # Import here to avoid circular imports
+        import pyrogram
+        # Get the running client instance
+        for instance in pyrogram.Client.instances:
+            if hasattr(instance, 'db_channel'):
+                self.client = instance
+                return instance
+        return None
 
-        except Exception as e:
-            print(f"ERROR in recover_pending_tasks: {e}")
+    async def run_due_tasks(self) -> None:
+        """
+        Lease due tasks from MongoDB in batches (oldest run_time first), merge them
+        per chat and delete each chat's messages with as few calls as possible.
+        """
+        if self._poll_lock.locked():
+            return
 
-    async def delete_messages(self, client: Client, chat_id: int, message_ids: list[int], base64_file_link: str, task_id: str = None) -> None:
-        try:
-            # Get client instance if not provided (for recovered tasks)
-            if client is None:
-                # Import here to avoid circular imports
-                import pyrogram
-                # Get the running client instance
-                for instance in pyrogram.Client.instances:
-                    if hasattr(instance, 'db_channel'):
-                        client = instance
-                        break
+        async with self._poll_lock:
+            try:
+                from bot.database.auto_delete_db import claim_due_tasks
 
+                client = self._get_client()
                 if client is None:
                     print("ERROR: No active bot client found for scheduler")
                     return
 
-            chunk_size = 100
-            chunked_ids = [message_ids[i:i+chunk_size] for i in range(0, len(message_ids), chunk_size)]
-            deleted_count = 0
+                while True:
+                    tasks = await claim_due_tasks(limit=POLL_BATCH_SIZE)
+                    if not tasks:
+                        return
 
-            for chunk in chunked_ids:
-                try:
-                    await client.delete_messages(chat_id=chat_id, message_ids=chunk)
-                    deleted_count += len(chunk)
-                    print(f"DEBUG: Deleted {len(chunk)} messages from chat {chat_id}")
-                    await asyncio.sleep(1)  # Avoid rate limits
-                except Exception as e:
-                    print(f"ERROR: Failed to delete chunk: {e}")
-                    continue
+                    await self.run_tasks(client, tasks)
 
-            # Send retrieve button only if messages were actually deleted
-            if deleted_count > 0:
-                retrieve_button = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🗂 Retrieve Deleted File(s)", url=f"https://t.me/{client.me.username}?start={base64_file_link}")]
-                ])
+                    if len(tasks) < POLL_BATCH_SIZE:
+                        return
 
-                success_msg = getattr(Config, 'AUTO_DEL_SUCCESS_MSG', f"✅ Successfully deleted {deleted_count} files. Click below to retrieve them again.")
+            except Exception as e:
+                print(f"ERROR in run_due_tasks: {e}")
 
+    async def run_wheel(self) -> None:
+        """Run the tasks whose wheel slot has come up"""
+        tasks = self.wheel.advance()
+        if not tasks:
+            return
+
+        client = self._get_client()
+        if client is None:
+            # Leave them to the poller once their lease runs out
+            print("ERROR: No active bot client found for scheduler")
+            return
+        await self.run_tasks(client, tasks)
+
+    async def run_tasks(self, client: Client, tasks: list) -> None:
+        """Merge due tasks per chat, run each chat's deletions together and drop the tasks from MongoDB"""
+        from bot.database.auto_delete_db import delete_saved_tasks
+
+        by_chat = {}
+        for task in tasks:
+            by_chat.setdefault(task['chat_id'], []).append(task)
+
+        await asyncio.gather(*(
+            self.delete_chat_tasks(client, chat_id, chat_tasks) for chat_id, chat_tasks in by_chat.items()
+        ))
+        try:
+            await delete_saved_tasks([task['_id'] for task in tasks if task.get('_id')])
+        except Exception as e:
+            print(f"ERROR: Failed to remove finished delete tasks: {e}")
+        print(f"DEBUG: Ran {len(tasks)} auto-delete tasks across {len(by_chat)} chats")
+
+    async def delete_chat_tasks(self, client: Client, chat_id: int, tasks: list) -> None:
+        """Delete every message of several due tasks for one chat and send a single retrieve notice"""
+        message_ids = list(dict.fromkeys(mid for task in tasks for mid in task['message_ids']))
+        deleted = await self._delete_ids(client, chat_id, message_ids)
+        if not deleted:
+            return
+
+        links = list(dict.fromkeys(task['base64_file_link'] for task in tasks))
+        await self._send_retrieve_notice(client, chat_id, deleted, links)
+
+    async def _delete_ids(self, client: Client, chat_id: int, message_ids: list[int]) -> int:
+        deleted_count = 0
+        for i in range(0, len(message_ids), DELETE_CHUNK_SIZE):
+            chunk = message_ids[i:i + DELETE_CHUNK_SIZE]
+            try:
+                await client.delete_messages(chat_id=chat_id, message_ids=chunk)
+                deleted_count += len(chunk)
+                print(f"DEBUG: Deleted {len(chunk)} messages from chat {chat_id}")
+            except Exception as e:
+                print(f"ERROR: Failed to delete chunk: {e}")
+                continue
+        return deleted_count
+
+    async def _send_retrieve_notice(self, client: Client, chat_id: int, deleted_count: int, base64_file_links: list) -> None:
+        success_msg = getattr(Config, 'AUTO_DEL_SUCCESS_MSG', f"✅ Successfully deleted {deleted_count} files. Click below to retrieve them again.")
+
+        # One notice per MAX_RETRIEVE_BUTTONS deliveries, numbered across notices
+        for start in range(0, len(base64_file_links), MAX_RETRIEVE_BUTTONS):
+            links = base64_file_links[start:start + MAX_RETRIEVE_BUTTONS]
+            retrieve_button = InlineKeyboardMarkup([
+                [InlineKeyboardButton(
+                    "🗂 Retrieve Deleted File(s)" if len(base64_file_links) == 1 else f"🗂 Retrieve Deleted File(s) #{i}",
+                    url=f"https://t.me/{client.me.username}?start={link}"
+                )]
+                for i, link in enumerate(links, start + 1)
+            ])
+
+            try:
                 await client.send_message(
                     chat_id=chat_id,
                     text=success_msg,
                     reply_markup=retrieve_button,
                 )
-                print(f"DEBUG: Auto-delete completed for {deleted_count} messages")
-
-            if task_id:
-                from bot.database.auto_delete_db import delete_saved_task
-                await delete_saved_task(task_id)
-
-        except Exception as e:
-            print(f"ERROR in delete_messages: {e}")
-            import traceback
-            traceback.print_exc()
+            except Exception as e:
+                print(f"ERROR: Failed to send retrieve notice to {chat_id}: {e}")
+                return
+        print(f"DEBUG: Auto-delete completed for {deleted_count} messages")
 
     async def schedule_delete(self, client: Client, chat_id: int, message_ids: list[int], delete_n_seconds: int, base64_file_link: str) -> None:
         try:
             run_time = datetime.datetime.now(tz=tzlocal.get_localzone()) + datetime.timedelta(seconds=delete_n_seconds)
             task_id = f"{chat_id}_{message_ids[0]}_{datetime.datetime.utcnow().timestamp()}"
 
-            # Save task to database
+            # Save task to database, leased to this process until shortly after it is due
             from bot.database.auto_delete_db import save_delete_task
             await save_delete_task(
                 chat_id=chat_id,
                 message_ids=message_ids,
                 base64_file_link=base64_file_link,
                 run_time=run_time,
-                task_id=task_id
+                task_id=task_id,
+                lease=self.lease,
+                leased_until=run_time + datetime.timedelta(seconds=LEASE_GRACE)
             )
 
-            # Schedule the deletion job
-            self.scheduler.add_job(
-                func=self.delete_messages,
-                trigger="date",
-                run_date=run_time,
-                args=[client, chat_id, message_ids, base64_file_link, task_id],
-                id=task_id,
-                misfire_grace_time=60,
-                replace_existing=True
-            )
+            # Round up to the coalescing window so a user's deliveries a few seconds
+            # apart are deleted with the same calls and share one notice
+            due_at = math.ceil(run_time.timestamp() / DELETE_COALESCE_WINDOW) * DELETE_COALESCE_WINDOW
+            task = {'_id': task_id, 'chat_id': chat_id, 'message_ids': message_ids, 'base64_file_link': base64_file_link}
+            expired = self.wheel.add(due_at, task)
+            if expired:
+                await self.run_tasks(client or self._get_client(), expired)
 
             print(f"DEBUG: Scheduled auto-delete for {len(message_ids)} messages in {delete_n_seconds} seconds")
 
@@ -164,4 +224,4 @@ class ScheduleManager:
             traceback.print_exc()
 
 # Global instance
-schedule_manager = ScheduleManager()
\ No newline at end of file
+schedule_manager = ScheduleManager()
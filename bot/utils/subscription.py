@@ -1,155 +1,145 @@
 # Cleaned & Updated by @Mak0912 (TG)
 
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from pyrogram.enums import ChatMemberStatus
 from info import Config
+from .channels import channel_store, fallback_link
+from .membership import check_memberships, JOINED_STATUSES, REQUEST_STATUSES
 
 
-async def handle_force_sub(client, message: Message):
-    user = message.from_user
-    not_joined_force = []
-    joined = []
-    buttons = []
+class _ForceSubTemplate:
+    """A rendered force-sub screen; text still holds the FORCE_MSG user placeholders"""
 
-    force_channels = getattr(Config, 'FORCE_SUB_CHANNEL', [])
-    request_channels = getattr(Config, 'REQUEST_CHANNEL', [])
-    all_channels = force_channels + request_channels
+    __slots__ = ("text", "buttons", "join_links")
 
-    if not all_channels:
-        return False
+    def __init__(self, text: str, buttons: list, join_links: list):
+        self.text = text
+        self.buttons = buttons
+        self.join_links = join_links
 
-    # Check force subscription channels (direct join)
-    for ch in force_channels:
-        try:
-            member = await client.get_chat_member(ch, user.id)
-            if member.status in (
-                ChatMemberStatus.OWNER,
-                ChatMemberStatus.ADMINISTRATOR,
-                ChatMemberStatus.MEMBER,
-            ):
-                joined.append(ch)
-            else:
-                not_joined_force.append(ch)
-        except Exception:
-            not_joined_force.append(ch)
 
-    # Check request channels (treat RESTRICTED as joined too)
-    for ch in request_channels:
-        try:
-            member = await client.get_chat_member(ch, user.id)
-            if member.status in (
-                ChatMemberStatus.OWNER,
-                ChatMemberStatus.ADMINISTRATOR,
-                ChatMemberStatus.MEMBER,
-                ChatMemberStatus.RESTRICTED  # treat join request as joined
-            ):
-                joined.append(ch)
-        except Exception:
-            pass  # ignore failure in request channel
+# {joined-set bitmask: _ForceSubTemplate}, valid while _template_signature matches
+_templates = {}
+_template_signature = None
+
+
+def _escape(text: str) -> str:
+    """Protect channel titles from str.format when the template is filled in"""
+    return text.replace("{", "{{").replace("}", "}}")
 
-    # If all required channels are joined or requested, skip message
-    if not not_joined_force:
-        return False
 
-    # Create buttons for force subscription channels
+def _build_template(client, force_channels: list, request_channels: list, joined: set) -> _ForceSubTemplate:
+    buttons = []
+    join_links = []
+
+    # Create buttons for force subscription channels from the channel metadata store
     for ch in force_channels:
-        try:
-            if hasattr(client, 'channel_info') and client.channel_info.get(ch):
-                info = client.channel_info.get(ch)
-            else:
-                chat = await client.get_chat(ch)
-                info = {
-                    'title': chat.title,
-                    'invite_link': chat.invite_link
-                }
-
-            url = info.get("invite_link")
-            title = info.get("title", f"Channel {ch}")
-
-            if not url:
-                try:
-                    url = await client.export_chat_invite_link(ch)
-                except:
-                    url = f"https://t.me/c/{str(ch)[4:]}"
-
-            if url and url.strip():
-                if ch in joined:
-                    buttons.append([InlineKeyboardButton(f"✅ {title}", url=url)])
-                else:
-                    buttons.append([InlineKeyboardButton(f"📢 Join {title}", url=url)])
-        except Exception as e:
-            print(f"Error creating button for force channel {ch}: {e}")
-            buttons.append([InlineKeyboardButton(f"📢 Join Channel", url=f"https://t.me/c/{str(ch)[4:]}")])
+        title = channel_store.title(ch)
+        url = channel_store.invite_link(ch)
+        if ch in joined:
+            buttons.append([InlineKeyboardButton(f"✅ {title}", url=url)])
+        else:
+            buttons.append([InlineKeyboardButton(f"📢 Join {title}", url=url)])
 
     # Create buttons for request channels (optional display only)
     for ch in request_channels:
-        try:
-            chat = await client.get_chat(ch)
-            title = chat.title or f"Channel {ch}"
-
-            if ch in joined:
-                buttons.append([InlineKeyboardButton(f"✅ {title}", url=f"https://t.me/c/{str(ch)[4:]}")])
-            elif Config.JOIN_REQUEST_ENABLE:
-                try:
-                    invite_link = await client.create_chat_invite_link(
-                        ch,
-                        creates_join_request=True,
-                        name=f"Join Request for {user.first_name or user.id}"
-                    )
-                    url = invite_link.invite_link
-                    buttons.append([InlineKeyboardButton(f"🔔 Request to Join {title}", url=url)])
-                except Exception as e:
-                    print(f"DEBUG: Failed to create join request link for {ch}: {e}")
-                    try:
-                        url = await client.export_chat_invite_link(ch)
-                        buttons.append([InlineKeyboardButton(f"📢 Join {title}", url=url)])
-                    except:
-                        buttons.append([InlineKeyboardButton(f"📢 Join {title}", url=f"https://t.me/c/{str(ch)[4:]}")])
-        except Exception as e:
-            print(f"Error creating button for request channel {ch}: {e}")
+        title = channel_store.title(ch)
 
-    # Add "Try Again" button if payload is present
-    if hasattr(message, 'command') and message.command is not None and len(message.command) > 1:
-        payload = message.command[1]
-        if client.username:
-            buttons.append([
-                InlineKeyboardButton("🔁 Try Again", url=f"https://t.me/{client.username}?start={payload}")
-            ])
+        if ch in joined:
+            buttons.append([InlineKeyboardButton(f"✅ {title}", url=fallback_link(ch))])
+        elif Config.JOIN_REQUEST_ENABLE:
+            # Shared join-request link from the pool; no invite link is created per user
+            url = channel_store.join_request_link(client, ch)
+            if url:
+                join_links.append((ch, url))
+                buttons.append([InlineKeyboardButton(f"🔔 Request to Join {title}", url=url)])
+            else:
+                buttons.append([InlineKeyboardButton(f"📢 Join {title}", url=channel_store.invite_link(ch))])
 
     # Build channel join status text
     joined_txt = ""
 
     # Force sub channels
     for ch in force_channels:
-        try:
-            if hasattr(client, 'channel_info') and client.channel_info.get(ch):
-                title = client.channel_info.get(ch).get("title", f"Channel {ch}")
-            else:
-                chat = await client.get_chat(ch)
-                title = chat.title
-        except:
-            title = f"Channel {ch}"
-
         if ch in joined:
-            joined_txt += f"✅ <b>{title}</b> (Force Sub)\n"
+            joined_txt += f"✅ <b>{_escape(channel_store.title(ch))}</b> (Force Sub)\n"
         else:
-            joined_txt += f"❌ <b>{title}</b> (Force Sub)\n"
+            joined_txt += f"❌ <b>{_escape(channel_store.title(ch))}</b> (Force Sub)\n"
 
     # Request channels
     for ch in request_channels:
-        try:
-            chat = await client.get_chat(ch)
-            title = chat.title or f"Channel {ch}"
-        except:
-            title = f"Channel {ch}"
-
         if ch in joined:
-            joined_txt += f"✅ <b>{title}</b> (Request)</b>\n"
+            joined_txt += f"✅ <b>{_escape(channel_store.title(ch))}</b> (Request)</b>\n"
+        else:
+            joined_txt += f"❌ <b>{_escape(channel_store.title(ch))}</b> (Request)</b>\n"
+
+    text = f"{Config.FORCE_MSG}\n\n<b>📋 Channel Join Status:</b>\n{joined_txt}"
+
+    # Instructions only for force sub (since request can pass even unapproved);
+    # templates are only built when some force channel is not joined
+    text += f"\n🔽 <b>Instructions:</b>\n"
+    text += f"📢 <b>Force Sub:</b> Click the buttons below to join the required channels."
+
+    return _ForceSubTemplate(text, buttons, join_links)
+
+
+def _get_template(client, force_channels: list, request_channels: list, mask: int) -> _ForceSubTemplate:
+    global _templates, _template_signature
+
+    # Any change to the channel lists, messages or channel metadata drops every template
+    signature = (tuple(force_channels), tuple(request_channels), Config.FORCE_MSG,
+                 Config.JOIN_REQUEST_ENABLE, channel_store.version)
+    if signature != _template_signature:
+        _templates = {}
+        _template_signature = signature
+
+    template = _templates.get(mask)
+    if template is None:
+        all_channels = force_channels + request_channels
+        joined = {ch for i, ch in enumerate(all_channels) if mask & (1 << i)}
+        template = _build_template(client, force_channels, request_channels, joined)
+        _templates[mask] = template
+    return template
+
+
+async def handle_force_sub(client, message: Message):
+    user = message.from_user
+    not_joined_force = []
+    joined = []
+
+    force_channels = getattr(Config, 'FORCE_SUB_CHANNEL', [])
+    request_channels = getattr(Config, 'REQUEST_CHANNEL', [])
+    all_channels = force_channels + request_channels
+
+    if not all_channels:
+        return False
+
+    # Check every channel at once, answered from the membership cache when possible
+    statuses = await check_memberships(client, list(dict.fromkeys(all_channels)), user.id)
+
+    # Force subscription channels (direct join)
+    for ch in force_channels:
+        if statuses[ch] in JOINED_STATUSES:
+            joined.append(ch)
         else:
-            joined_txt += f"❌ <b>{title}</b> (Request)</b>\n"
+            not_joined_force.append(ch)
+
+    # Request channels (treat RESTRICTED and pending join requests as joined too)
+    for ch in request_channels:
+        if statuses[ch] in REQUEST_STATUSES:
+            joined.append(ch)
+
+    # If all required channels are joined or requested, skip message
+    if not not_joined_force:
+        return False
+
+    # Unjoined users get the same screen as everyone with the same joined set,
+    # so it is rendered once per bitmask and only the user fields are filled in
+    mask = sum(1 << i for i, ch in enumerate(all_channels) if ch in joined)
+    template = _get_template(client, force_channels, request_channels, mask)
+    for ch, link in template.join_links:
+        channel_store.note_served(client, ch, link)
 
-    # Format base message
-    fsub_msg = Config.FORCE_MSG.format(
+    final_message = template.text.format(
         first=user.first_name,
         last=user.last_name or "",
         username=f"@{user.username}" if user.username else "N/A",
@@ -157,19 +147,22 @@ async def handle_force_sub(client, message: Message):
         id=user.id
     )
 
-    final_message = f"{fsub_msg}\n\n<b>📋 Channel Join Status:</b>\n{joined_txt}"
-
-    # Instructions only for force sub (since request can pass even unapproved)
-    if not_joined_force:
-        final_message += f"\n🔽 <b>Instructions:</b>\n"
-        final_message += f"📢 <b>Force Sub:</b> Click the buttons below to join the required channels."
-
     # Ensure message doesn't exceed Telegram's 4096 character limit
     if len(final_message) > 4096:
         # Truncate the message and add indicator
         final_message = final_message[:4090] + "..."
         print(f"WARNING: Force subscription message truncated due to length: {len(final_message)} chars")
 
+    buttons = template.buttons
+
+    # Add "Try Again" button if payload is present
+    if hasattr(message, 'command') and message.command is not None and len(message.command) > 1:
+        payload = message.command[1]
+        if client.username:
+            buttons = buttons + [[
+                InlineKeyboardButton("🔁 Try Again", url=f"https://t.me/{client.username}?start={payload}")
+            ]]
+
     # If buttons exist, add markup
     reply_markup = InlineKeyboardMarkup(buttons) if buttons else None
 
@@ -195,4 +188,4 @@ async def handle_force_sub(client, message: Message):
         except Exception as e2:
             print(f"Error sending fallback message: {e2}")
             await message.reply("❌ Please join the required channels to continue.")
-        return True
\ No newline at end of file
+        return True
@@ -0,0 +1,76 @@
+import math
+import time
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel. Level 0 has one slot per tick; every higher level
+    has slots as wide as a full turn of the level below. Adding and expiring an
+    item is O(1) amortized no matter how many items are pending; items in higher
+    levels cascade down as their slot comes up. Delays beyond the top level
+    wait in an overflow list.
+    """
+
+    def __init__(self, tick: float = 1.0, sizes: tuple = (60, 60, 24)):
+        self.tick = tick
+        self.sizes = sizes
+        self.wheels = [[[] for _ in range(size)] for size in sizes]
+        self.overflow = []
+        self.current = int(time.time() // tick)
+        self.pending = 0
+
+    def _span(self, level: int) -> int:
+        """Ticks covered by one slot of level"""
+        return math.prod(self.sizes[:level])
+
+    def _place(self, due_tick: int, item, expired: list):
+        delay = due_tick - self.current
+        if delay <= 0:
+            expired.append(item)
+            return
+
+        for level, size in enumerate(self.sizes):
+            span = self._span(level)
+            if delay < span * size:
+                self.wheels[level][(due_tick // span) % size].append((due_tick, item))
+                return
+        self.overflow.append((due_tick, item))
+
+    def add(self, due_at: float, item) -> list:
+        """Schedule item for the unix time due_at; returns [item] if that is already past"""
+        expired = []
+        self._place(math.ceil(due_at / self.tick), item, expired)
+        self.pending += 1 - len(expired)
+        return expired
+
+    def advance(self, now: float = None) -> list:
+        """Move the wheel up to now and return every item that fell due"""
+        target = int((time.time() if now is None else now) // self.tick)
+        expired = []
+
+        while self.current < target:
+            self.current += 1
+
+            # Bring the items of higher-level slots that start now down a level,
+            # top level first so they settle in the right lower slot
+            if self.current % self._span(len(self.sizes)) == 0:
+                overflow, self.overflow = self.overflow, []
+                for due_tick, item in overflow:
+                    self._place(due_tick, item, expired)
+            for level in range(len(self.sizes) - 1, 0, -1):
+                span = self._span(level)
+                if self.current % span == 0:
+                    slot = (self.current // span) % self.sizes[level]
+                    bucket, self.wheels[level][slot] = self.wheels[level][slot], []
+                    for due_tick, item in bucket:
+                        self._place(due_tick, item, expired)
+
+            slot = self.current % self.sizes[0]
+            bucket, self.wheels[0][slot] = self.wheels[0][slot], []
+            expired.extend(item for _, item in bucket)
+
+        self.pending -= len(expired)
+        return expired
+
+    def __len__(self):
+        return self.pending
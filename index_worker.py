@@ -0,0 +1,46 @@
+import uvloop
+import asyncio
+import secrets
+import traceback
+from pyrogram import Client
+from info import Config
+from bot.utils.indexer import index_jobs
+
+uvloop.install()
+
+async def main():
+    # Own session and event loop: long crawls never compete with the bot's handlers
+    worker = Client(
+        name="PS-LinkVault-indexer",
+        api_id=Config.API_ID,
+        api_hash=Config.API_HASH,
+        bot_token=Config.BOT_TOKEN,
+        workers=2,
+        # Only makes API calls; updates are left to the bot, which has the handlers
+        no_updates=True
+    )
+    worker_id = f"indexer-{secrets.token_hex(4)}"
+    try:
+        print("🚀 Starting indexing worker...")
+        await worker.start()
+        print(f"✅ Indexing worker {worker_id} started, waiting for jobs")
+        await index_jobs.serve(worker, worker_id, max_jobs=Config.INDEX_WORKER_JOBS)
+
+    except KeyboardInterrupt:
+        print("🛑 Indexing worker shutdown requested by user")
+    except Exception as critical_error:
+        print(f"💥 CRITICAL ERROR: {critical_error}")
+        print(f"Traceback: {traceback.format_exc()}")
+    finally:
+        try:
+            if worker.is_connected:
+                await worker.stop()
+                print("✅ Indexing worker stopped successfully")
+        except Exception as stop_error:
+            print(f"⚠️ Error during shutdown: {stop_error}")
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except Exception as startup_error:
+        print(f"💥 STARTUP FAILURE: {startup_error}")
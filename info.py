@@ -83,6 +83,15 @@ class Config(object):
     AUTO_DELETE_MSG = getenv("AUTO_DELETE_MSG", "This file will be automatically deleted in {time}.")
     AUTO_DEL_SUCCESS_MSG = getenv("AUTO_DEL_SUCCESS_MSG", "✅ File deleted successfully.")
 
+    # Broadcast Configuration - Load from environment
+    BROADCAST_RATE = float(getenv("BROADCAST_RATE", "20"))       # Messages per second across all senders
+    BROADCAST_WORKERS = int(getenv("BROADCAST_WORKERS", "8"))    # Concurrent senders
+
+    # Channel Re-index Configuration - Load from environment
+    INDEX_VERIFY_SAMPLE = int(getenv("INDEX_VERIFY_SAMPLE", "0"))  # Indexed files re-checked for deletion per re-index (0 = off)
+    INDEX_WORKER = getenv("INDEX_WORKER", "False").lower() in ("true", "1", "yes")  # Leave crawls to index_worker.py
+    INDEX_WORKER_JOBS = int(getenv("INDEX_WORKER_JOBS", "2"))      # Crawls one worker runs at once
+
     # Token Verification (Shortlink) - Load from environment
     VERIFY_MODE = getenv("VERIFY_MODE", "True").lower() in ("true", "1", "yes")
     SHORTLINK_API = getenv("SHORTLINK_API")